@@ -1,7 +1,10 @@
+import asyncio
+
 from request_handler.requests_handler import RequestHandler
 from conf.settings import WORKERS_AMOUNT, TIMEOUT, ALL_APPS_URL, OWNED_APPS_URL, APP_DETAILS_URL
 from apps.models import App, AppDetails, AppOwned
-from typing import List, Union
+from apps.parsers import JSONArrayStreamParser
+from typing import List, Union, AsyncIterator
 
 
 class AppsHandler:
@@ -11,6 +14,7 @@ class AppsHandler:
         self.timeout = None
         self.requests_handler = None
         self.client_session = None
+        self.requests_handler_owner = False
 
     @classmethod
     async def create(
@@ -27,6 +31,7 @@ class AppsHandler:
         self.proxy = proxy
 
         if requests_handler is None:
+            self.requests_handler_owner = True
             self.requests_handler = await RequestHandler.create(
                 proxy=self.proxy,
                 workers_amount=self.workers_amount,
@@ -37,9 +42,13 @@ class AppsHandler:
 
         return self
 
+    async def close(self):
+        if self.requests_handler_owner:
+            await self.requests_handler.close()
+
     async def get_apps_list(self, client_session: callable = None) -> Union[None, List[App]]:
         if client_session is None:
-            client_session = await self.requests_handler.create_session()
+            client_session = await self.requests_handler.get_session()
 
         response = await self.requests_handler.request_handler(
             session=client_session,
@@ -53,11 +62,31 @@ class AppsHandler:
 
         return None
 
+    async def iter_apps_list(self, client_session: callable = None, executor: bool = False) -> AsyncIterator[App]:
+        if client_session is None:
+            client_session = await self.requests_handler.get_session()
+
+        loop = asyncio.get_running_loop()
+        parser = JSONArrayStreamParser(key='apps')
+
+        async for chunk in self.requests_handler.stream_request(session=client_session, url=ALL_APPS_URL):
+            if executor:
+                items = await loop.run_in_executor(None, parser.feed, chunk)
+            else:
+                items = parser.feed(chunk)
+
+            for item in items:
+                yield App(**item)
+
+        # a body cut short would otherwise pass for a complete but shorter list
+        if not parser.finished:
+            raise ValueError(f'Apps list from "{ALL_APPS_URL}" ended before the closing bracket of its array')
+
     async def get_owned_apps(self, api_key: str, steam_id: str, include_appinfo: bool = True,
                              include_played_free_games: bool = True,
                              client_session: callable = None) -> Union[None, List[AppOwned]]:
         if client_session is None:
-            client_session = await self.requests_handler.create_session()
+            client_session = await self.requests_handler.get_session()
 
         params = {
             'key': api_key,
@@ -82,7 +111,7 @@ class AppsHandler:
 
     async def get_app_details(self, app_id: str, client_session: callable = None) -> AppDetails | None:
         if client_session is None:
-            client_session = await self.requests_handler.create_session()
+            client_session = await self.requests_handler.get_session()
 
         params = {
             'appids': app_id
@@ -0,0 +1,58 @@
+import re
+
+from json import JSONDecoder, JSONDecodeError
+
+
+class JSONArrayStreamParser:
+    separators = re.compile(r'[\s,]*')
+
+    def __init__(self, key: str):
+        self.marker = f'"{key}"'
+        self.decoder = JSONDecoder()
+        self.buffer = ''
+        self.started = False
+        self.finished = False
+
+    def feed(self, chunk: str) -> list:
+        if self.finished:
+            return []
+
+        self.buffer += chunk
+
+        if not self.started:
+            start = self.buffer.find(self.marker)
+            if start == -1:
+                # keep a tail in case the key is split between two chunks
+                self.buffer = self.buffer[-len(self.marker):]
+                return []
+
+            array_start = self.buffer.find('[', start)
+            if array_start == -1:
+                self.buffer = self.buffer[start:]
+                return []
+
+            self.buffer = self.buffer[array_start + 1:]
+            self.started = True
+
+        items = []
+        position = 0
+        while True:
+            position = self.separators.match(self.buffer, position).end()
+            if position >= len(self.buffer):
+                break
+
+            if self.buffer[position] == ']':
+                self.finished = True
+                break
+
+            try:
+                item, position = self.decoder.raw_decode(self.buffer, position)
+            except JSONDecodeError:
+                # the object continues in the next chunk
+                break
+
+            items.append(item)
+
+        self.buffer = '' if self.finished else self.buffer[position:]
+
+        return items
@@ -13,15 +13,94 @@ RSA_DATA_URL = config('RSA_DATA_URL')
 LOGIN_URL = config('LOGIN_URL')
 MARKET_PRICE_OVERVIEW_URL = config('MARKET_PRICE_OVERVIEW_URL')
 MARKET_SEARCH_URL = config('MARKET_SEARCH_URL')
+MARKET_LISTINGS_URL = config('MARKET_LISTINGS_URL')
+MARKET_ORDERS_HISTOGRAM_URL = config('MARKET_ORDERS_HISTOGRAM_URL')
 
 TIMEOUT = int(config('TIMEOUT'))
 TIMEOUT_MARKET = int(config('TIMEOUT_MARKET'))
 WORKERS_AMOUNT = int(config('WORKERS_AMOUNT'))
 
+RETRY_MAX_ATTEMPTS = int(config('RETRY_MAX_ATTEMPTS'))
+RETRY_MAX_RATE_LIMITED = int(config('RETRY_MAX_RATE_LIMITED'))
+RETRY_BASE_DELAY = float(config('RETRY_BASE_DELAY'))
+RETRY_MAX_DELAY = float(config('RETRY_MAX_DELAY'))
+CIRCUIT_FAILURE_THRESHOLD = int(config('CIRCUIT_FAILURE_THRESHOLD'))
+CIRCUIT_RESET_TIMEOUT = float(config('CIRCUIT_RESET_TIMEOUT'))
+
+SESSION_POOL_SIZE = int(config('SESSION_POOL_SIZE'))
+CONNECTOR_LIMIT = int(config('CONNECTOR_LIMIT'))
+CONNECTOR_LIMIT_PER_HOST = int(config('CONNECTOR_LIMIT_PER_HOST'))
+DNS_CACHE_TTL = int(config('DNS_CACHE_TTL'))
+KEEPALIVE_TIMEOUT = int(config('KEEPALIVE_TIMEOUT'))
+STREAM_CHUNK_SIZE = int(config('STREAM_CHUNK_SIZE'))
+
+PROXY_BUDGET = int(config('PROXY_BUDGET'))
+PROXY_BUDGET_WINDOW = int(config('PROXY_BUDGET_WINDOW'))
+PROXY_COOLDOWN = int(config('PROXY_COOLDOWN'))
+PROXY_MAX_FAILURES = int(config('PROXY_MAX_FAILURES'))
+PROXY_QUARANTINE = int(config('PROXY_QUARANTINE'))
+PROXY_QUARANTINE_MAX = int(config('PROXY_QUARANTINE_MAX'))
+
+RATE_LIMIT_INITIAL = float(config('RATE_LIMIT_INITIAL'))
+RATE_LIMIT_MIN = float(config('RATE_LIMIT_MIN'))
+RATE_LIMIT_MAX = float(config('RATE_LIMIT_MAX'))
+RATE_LIMIT_INCREASE = float(config('RATE_LIMIT_INCREASE'))
+RATE_LIMIT_DECREASE = float(config('RATE_LIMIT_DECREASE'))
+RATE_LIMITS = {
+    APP_DETAILS_URL: float(config('RATE_LIMIT_APP_DETAILS')),
+    MARKET_SEARCH_URL: float(config('RATE_LIMIT_MARKET_SEARCH')),
+    MARKET_PRICE_OVERVIEW_URL: float(config('RATE_LIMIT_PRICE_OVERVIEW')),
+    MARKET_LISTINGS_URL: float(config('RATE_LIMIT_LISTINGS')),
+    MARKET_ORDERS_HISTOGRAM_URL: float(config('RATE_LIMIT_ORDERS_HISTOGRAM'))
+}
+# every item has its own page under these, they share one limit, breaker and metrics
+RATE_LIMIT_PREFIXES = (MARKET_LISTINGS_URL,)
+
+DB_CODEC = config('DB_CODEC')
+DB_WAL = config('DB_WAL', cast=bool)
+DB_WAL_COMPACT_SIZE = int(config('DB_WAL_COMPACT_SIZE'))
+DB_CHECKPOINT_EVERY = int(config('DB_CHECKPOINT_EVERY'))
+DB_CHECKPOINT_INTERVAL = float(config('DB_CHECKPOINT_INTERVAL'))
+DB_MMAP = config('DB_MMAP', cast=bool)
+DB_LAZY_MAX_SECTIONS = int(config('DB_LAZY_MAX_SECTIONS'))
+
+CODEC_EXECUTOR = config('CODEC_EXECUTOR', default='')
+CODEC_EXECUTOR_WORKERS = int(config('CODEC_EXECUTOR_WORKERS'))
+CODEC_INLINE_SIZE = int(config('CODEC_INLINE_SIZE'))
+
 ALL_APPS_JSON_FILE = BASE_DIR.parent / Path(config('ALL_APPS_JSON_FILE'))
 PREDEFINED_APPS_JSON_FILE = BASE_DIR.parent / Path(config('PREDEFINED_APPS_JSON_FILE'))
 BOOSTER_PACKS_JSON_FILE = BASE_DIR.parent / Path(config('BOOSTER_PACKS_JSON_FILE'))
+ITEM_NAMEIDS_JSON_FILE = BASE_DIR.parent / Path(config('ITEM_NAMEIDS_JSON_FILE'))
 OWNED_APPS_JSON_FOLDER = BASE_DIR.parent / Path(config('OWNED_APPS_JSON_FOLDER'))
+
+PRICE_HISTORY = config('PRICE_HISTORY', cast=bool)
+PRICE_HISTORY_FOLDER = BASE_DIR.parent / Path(config('PRICE_HISTORY_FOLDER'))
+
 PROXIES = BASE_DIR.parent / Path(config('PROXIES'))
 USER_AGENTS = BASE_DIR.parent / Path(config('USER_AGENTS'))
 ACCOUNTS = BASE_DIR.parent / Path(config('ACCOUNTS'))
+
+RESPONSE_CACHE_FOLDER = BASE_DIR.parent / Path(config('RESPONSE_CACHE_FOLDER'))
+RESPONSE_CACHE_MAX_SIZE = int(config('RESPONSE_CACHE_MAX_SIZE'))
+RESPONSE_CACHE_TTLS = {
+    ALL_APPS_URL: int(config('RESPONSE_CACHE_TTL_ALL_APPS')),
+    APP_DETAILS_URL: int(config('RESPONSE_CACHE_TTL_APP_DETAILS'))
+}
+
+PRICE_CACHE_TTL = int(config('PRICE_CACHE_TTL'))
+PRICE_CACHE_TTLS = {
+    '753-Sack of Gems': int(config('PRICE_CACHE_TTL_GEMS'))
+}
+PRICE_CACHE_MAX_SIZE = int(config('PRICE_CACHE_MAX_SIZE'))
+PRICE_CACHE_FILE = config('PRICE_CACHE_FILE', default='')
+PRICE_CACHE_FILE = BASE_DIR.parent / Path(PRICE_CACHE_FILE) if PRICE_CACHE_FILE else None
+
+FX_REFERENCE_ITEMS = [
+    (int(item.split(':', 1)[0]), item.split(':', 1)[1])
+    for item in config('FX_REFERENCE_ITEMS').split(',') if item.strip()
+]
+FX_TTL = int(config('FX_TTL'))
+
+ARCHIVE_MODE = config('ARCHIVE_MODE', default='')
+ARCHIVE_FILE = BASE_DIR.parent / Path(config('ARCHIVE_FILE'))
@@ -0,0 +1,91 @@
+import asyncio
+
+from time import perf_counter
+from conf.settings import DB_CHECKPOINT_EVERY, DB_CHECKPOINT_INTERVAL, LOGS
+from request_handler.metrics import Histogram
+
+
+class Checkpointer:
+    def __init__(self):
+        self.db = None
+        self.every = None
+        self.interval = None
+        self.mutations = 0
+        self.flushed = 0
+        self.stopping = False
+        self.checkpoints = 0
+        self.duration = Histogram()
+        self.wakeup = asyncio.Event()
+        self.task = None
+
+    @classmethod
+    def create(cls, db, every: int = DB_CHECKPOINT_EVERY, interval: float = DB_CHECKPOINT_INTERVAL):
+        self = cls()
+        self.db = db
+        self.every = every
+        self.interval = interval
+        self.task = asyncio.create_task(self.run())
+
+        return self
+
+    @property
+    def pending(self) -> int:
+        return self.mutations - self.flushed
+
+    def mutated(self):
+        self.mutations += 1
+        if self.pending >= self.every:
+            self.wakeup.set()
+
+    def covered(self, mutations: int):
+        # any write of the database counts, including the ones made outside the checkpointer
+        self.flushed = max(self.flushed, mutations)
+
+    async def run(self):
+        while not self.stopping:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+
+            if self.stopping:
+                break
+
+            try:
+                await self.checkpoint()
+            except Exception as e:
+                # a failed checkpoint keeps its mutations pending, the next one retries them
+                LOGS['stdout_error'].error(f'Checkpoint of "{self.db.location}" failed: {e!r}')
+
+    async def checkpoint(self) -> bool:
+        if not self.pending:
+            return False
+
+        # mutations made while the flush runs stay pending, and so does everything when it fails or is cancelled
+        mutations = self.mutations
+        start = perf_counter()
+        await self.db.flush()
+        self.covered(mutations)
+
+        self.duration.observe(perf_counter() - start)
+        self.checkpoints += 1
+
+        return True
+
+    async def close(self):
+        # the loop is stopped rather than cancelled, so a checkpoint in flight finishes before the last one starts
+        if self.task is not None:
+            self.stopping = True
+            self.wakeup.set()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+        await self.checkpoint()
+
+    def snapshot(self) -> dict:
+        return {
+            'checkpoints': self.checkpoints,
+            'pending': self.pending,
+            'duration': self.duration.snapshot()
+        }
@@ -0,0 +1,137 @@
+import json
+import asyncio
+
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from conf.settings import DB_CODEC, CODEC_EXECUTOR, CODEC_EXECUTOR_WORKERS, CODEC_INLINE_SIZE
+from database.exceptions import CodecNotAvailable, UnknownFormat
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class JSONCodec:
+    name = 'json'
+    binary = False
+
+    @staticmethod
+    def dumps(data) -> bytes:
+        return json.dumps(data).encode('utf8')
+
+    @staticmethod
+    def loads(data: bytes | str):
+        return json.loads(data)
+
+
+class OrjsonCodec(JSONCodec):
+    name = 'orjson'
+
+    @staticmethod
+    def dumps(data) -> bytes:
+        return orjson.dumps(data)
+
+    @staticmethod
+    def loads(data: bytes | str):
+        return orjson.loads(data)
+
+
+class MsgpackCodec:
+    name = 'msgpack'
+    binary = True
+
+    @staticmethod
+    def dumps(data) -> bytes:
+        return msgpack.packb(data, use_bin_type=True)
+
+    @staticmethod
+    def loads(data: bytes):
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+CODECS = {
+    'json': JSONCodec,
+    'orjson': OrjsonCodec,
+    'msgpack': MsgpackCodec
+}
+
+BACKENDS = {
+    'orjson': orjson,
+    'msgpack': msgpack
+}
+
+
+def get_codec(name: str = DB_CODEC):
+    # plain "json" transparently uses orjson when it is installed, the files stay the same
+    if name == 'json':
+        return OrjsonCodec if orjson is not None else JSONCodec
+
+    if name not in CODECS:
+        raise CodecNotAvailable(f'Unknown codec: {name}')
+
+    if BACKENDS.get(name, json) is None:
+        raise CodecNotAvailable(f'Codec "{name}" requires the {name} package')
+
+    return CODECS[name]
+
+
+def detect_codec(data: bytes):
+    head = data.lstrip()[:1]
+
+    if not head:
+        return None
+
+    if head in b'{["' or head.isdigit() or head in b'-tfn':
+        return get_codec('json')
+
+    # msgpack maps and arrays start with a fixmap/fixarray or map16/map32/array16/array32 marker
+    if head[0] in range(0x80, 0xa0) or head[0] in (0xdc, 0xdd, 0xde, 0xdf):
+        return get_codec('msgpack')
+
+    raise UnknownFormat
+
+
+EXECUTORS = {
+    'thread': ThreadPoolExecutor,
+    'process': ProcessPoolExecutor
+}
+
+executor = None
+
+
+def get_executor(kind: str = CODEC_EXECUTOR) -> Executor | None:
+    global executor
+
+    if not kind:
+        return None
+
+    if kind not in EXECUTORS:
+        raise CodecNotAvailable(f'Unknown codec executor: {kind}')
+
+    if executor is None:
+        executor = EXECUTORS[kind](max_workers=CODEC_EXECUTOR_WORKERS)
+
+    return executor
+
+
+async def run_codec(func, data, size: int):
+    pool = get_executor()
+
+    # handing a small payload to another thread or process costs more than encoding it right here
+    if pool is None or size < CODEC_INLINE_SIZE:
+        return func(data)
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(pool, func, data)
+
+
+async def decode(codec, data: bytes | str):
+    return await run_codec(codec.loads, data, len(data))
+
+
+JSON = get_codec('json')
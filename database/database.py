@@ -1,63 +1,244 @@
+import os
 import asyncio
-import json
 import aiofiles
 
-from json.decoder import JSONDecodeError
 from io import UnsupportedOperation
+from uuid import uuid4
+from functools import partial
 from os.path import basename
-from database.utils import catch_exception, deep_search, deep_delete
+from database.utils import catch_exception, deep_merge
+from database.codec import get_codec, detect_codec, decode, run_codec
+from database.wal import WriteAheadLog
+from database.checkpoint import Checkpointer
+from database.lazy import LazyData, dumps_sections, write_index, read_index
+from database.sqlite_database import SQLiteDatabase, SQLITE_SUFFIX
+from conf.settings import DB_WAL, DB_WAL_COMPACT_SIZE, DB_CHECKPOINT_EVERY, DB_CHECKPOINT_INTERVAL, DB_MMAP
 from pydantic.utils import deep_update
 
 
+def write_file(codec, location: str, data: dict) -> int:
+    file, offsets = dumps_sections(codec, data)
+
+    # a dump left running by a cancelled write must not share its temporary file with the next one
+    tmp_location = f'{location}.{os.getpid()}.{uuid4().hex}.tmp'
+    with open(tmp_location, mode='wb') as f:
+        size = f.write(file)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_location, location)
+    write_index(location, offsets)
+
+    return size
+
+
 class Connection:
     def __init__(self):
         self.connection = None
         self.read_only = None
         self.location = None
         self.data = None
+        self.journal = None
+        self.codec = None
+        self.wal = None
+        self.size = 0
+        self.index = {}
+        self.checkpointer = None
+        self.write_lock = asyncio.Lock()
 
     @classmethod
-    async def connect(cls, location: str, read_only: bool = False):
+    async def connect(cls, location: str, read_only: bool = False, codec: str = None, wal: bool = DB_WAL,
+                      lazy: bool = False, use_mmap: bool = DB_MMAP):
         self = cls()
         self.location = location
         self.read_only = read_only
+        self.codec = get_codec(codec) if codec is not None else None
         self.connection = await self.open_db()
-        self.data = await self.read()
+        self.data = self.read_lazy(use_mmap) if lazy else None
+        if self.data is None:
+            self.data = await self.read()
+        self.build_index()
+
+        wal_location = f'{self.location}.wal'
+        if wal and (not read_only or os.path.exists(wal_location)):
+            self.wal = await WriteAheadLog.open(wal_location, read_only=read_only)
+            for record in await self.wal.read():
+                self.apply(record)
+
         return self
 
     async def open_db(self):
         if self.read_only:
-            fp = await aiofiles.open(self.location, mode='r', encoding='utf8')
+            fp = await aiofiles.open(self.location, mode='rb')
         else:
-            fp = await aiofiles.open(self.location, mode='r+', encoding='utf8')
+            fp = await aiofiles.open(self.location, mode='rb+')
 
         return fp
 
     async def disconnect(self):
+        await self.stop_checkpoints()
+
+        if isinstance(self.data, LazyData):
+            self.data.close()
+
         if self.connection is not None:
             await self.connection.close()
             self.connection = None
 
+        if self.wal is not None:
+            await self.wal.close()
+            self.wal = None
+
     async def read(self):
         file = await self.connection.read()
+        self.size = len(file)
 
-        try:
-            data = json.loads(file)
-        except JSONDecodeError:
-            raise
+        # the format of the file on disk wins, an explicit codec only decides how it is written back
+        codec = detect_codec(file)
+        if self.codec is None:
+            self.codec = codec or get_codec()
+
+        if codec is None:
+            return {}
+
+        return await decode(codec, file)
+
+    def read_lazy(self, use_mmap: bool) -> LazyData | None:
+        fileno = self.connection.fileno()
+        offsets = read_index(str(self.location), fileno)
+        if offsets is None:
+            return None
 
-        return data
+        self.size = os.fstat(fileno).st_size
+        if self.codec is None:
+            self.codec = detect_codec(os.pread(fileno, 64, 0))
+
+        # sections are only decoded when they are first used, the index grows with them
+        return LazyData(fileno, offsets, codec=self.codec, on_load=self.index_section, use_mmap=use_mmap)
+
+    def materialize(self):
+        if isinstance(self.data, LazyData):
+            self.data = self.data.materialize()
 
     async def write(self):
         if self.read_only:
             raise UnsupportedOperation(f"{basename(self.location)} is not writable")
 
-        await self.connection.seek(0)
-        await self.connection.write(json.dumps(self.data))
-        await self.connection.truncate()
+        self.materialize()
+
+        async with self.write_lock:
+            mutations = self.checkpointer.mutations if self.checkpointer is not None else 0
+
+            # the previous size is the best guess of how expensive this dump is going to be
+            self.size = await run_codec(partial(write_file, self.codec, str(self.location)), self.snapshot(), self.size)
+
+            # the snapshot holds every mutation counted so far, the checkpointer has nothing left to flush for them
+            if self.checkpointer is not None:
+                self.checkpointer.covered(mutations)
+
+            # the old descriptor still points at the replaced file
+            await self.connection.close()
+            self.connection = await self.open_db()
+
+            # compaction: the snapshot is on disk before the log that produced it is dropped
+            if self.wal is not None:
+                await self.wal.truncate()
 
         return True
 
+    def snapshot(self) -> dict:
+        # sets are copied so the loop can keep mutating them while the copy is serialized,
+        # records themselves are replaced on displace rather than changed in place
+        return {k: v.copy() if isinstance(v, (dict, list)) else v for k, v in self.data.items()}
+
+    async def flush(self):
+        # with a log only the records written since the last checkpoint have to reach the disk
+        if self.wal is not None:
+            await self.wal.sync()
+        else:
+            await self.write()
+
+    def start_checkpoints(self, every: int = DB_CHECKPOINT_EVERY, interval: float = DB_CHECKPOINT_INTERVAL):
+        if self.read_only or self.checkpointing:
+            return
+        self.checkpointer = Checkpointer.create(self, every=every, interval=interval)
+
+    async def stop_checkpoints(self):
+        if self.checkpointing:
+            await self.checkpointer.close()
+
+    @property
+    def checkpointing(self) -> bool:
+        return self.checkpointer is not None and self.checkpointer.task is not None
+
+    def mutated(self):
+        if self.checkpointing:
+            self.checkpointer.mutated()
+
+    def checkpoint_metrics(self) -> dict | None:
+        return self.checkpointer.snapshot() if self.checkpointer is not None else None
+
+    def build_index(self):
+        self.index = {}
+        sections = self.data.loaded if isinstance(self.data, LazyData) else self.data
+        for section, items in sections.items():
+            self.index_section(section, items)
+
+    def index_section(self, section: str, items):
+        # only records nested one level down (apps sets) are indexed, flat files need no lookup
+        if isinstance(items, dict):
+            for key, value in items.items():
+                if isinstance(value, dict):
+                    self.index[key] = section
+
+    def locate(self, key: str) -> str | None:
+        section = self.index.get(key)
+        if section is None:
+            return None
+
+        # an entry can go stale when data is replaced directly, so the index is only a hint
+        items = self.data.get(section)
+        if isinstance(items, dict) and key in items:
+            return section
+
+        del self.index[key]
+        return None
+
+    def merge(self, data: dict):
+        deep_merge(self.data, data)
+        for section, items in data.items():
+            self.index_section(section, items)
+
+    def remove(self, key: str):
+        self.materialize()
+        section = self.locate(key)
+        if section is not None:
+            del self.data[section][key]
+            del self.index[key]
+        else:
+            self.data.pop(key, None)
+
+    def apply(self, record: dict):
+        if record['op'] == 'save':
+            self.merge(record['data'])
+        elif record['op'] == 'delete':
+            self.data.pop(record['key'], None)
+        elif record['op'] == 'displace':
+            self.remove(record['key'])
+            self.merge(record['data'])
+
+    async def log(self, op: str, key: str = None, data: dict = None):
+        if self.read_only:
+            raise UnsupportedOperation(f"{basename(self.location)} is not writable")
+
+        # the change is already in self.data, so a record appended while write() holds the lock is either in its
+        # snapshot or lands after the truncate, and replaying it twice is harmless
+        async with self.write_lock:
+            await self.wal.append(op, key=key, data=data)
+
+        if self.wal.size > DB_WAL_COMPACT_SIZE:
+            await self.write()
+
     def __del__(self):
         try:
             loop = asyncio.get_event_loop()
@@ -73,12 +254,24 @@ class Database(Connection):
     def __init__(self):
         super().__init__()
 
+    @classmethod
+    async def connect(cls, location: str, read_only: bool = False, codec: str = None, wal: bool = DB_WAL,
+                      lazy: bool = False, use_mmap: bool = DB_MMAP, table: str = None):
+        if str(location).endswith(SQLITE_SUFFIX):
+            return await SQLiteDatabase.connect(location=location, read_only=read_only, table=table)
+
+        return await super().connect(location=location, read_only=read_only, codec=codec, wal=wal,
+                                     lazy=lazy, use_mmap=use_mmap)
+
     async def get(self, key: str, default=None):
         try:
             return self.data[key]
         except KeyError:
             return default
 
+    async def section_sizes(self) -> dict:
+        return {section: len(items) for section, items in self.data.items() if isinstance(items, dict)}
+
     async def get_many(self, keys: list) -> list:
         return [catch_exception(lambda: self.data[key]) for key in keys]
 
@@ -87,29 +280,39 @@ class Database(Connection):
 
     async def delete(self, key) -> bool:
         del self.data[key]
-        await self.write()
+        if self.wal is not None:
+            await self.log('delete', key=key)
+            self.mutated()
+        else:
+            await self.write()
         return True
 
     async def save(self, data) -> bool:
-        self.data = deep_update(self.data, data)
-        await self.write()
+        self.merge(data)
+        if self.wal is not None:
+            await self.log('save', data=data)
+            self.mutated()
+        else:
+            await self.write()
         return True
 
     async def is_cached(self, key: str, keys_to_check: tuple = None, return_value: bool = False):
         if keys_to_check is not None:
+            # a lazy database only has to decode the sets that are asked about
             for k in keys_to_check:
-                search = deep_search(k, self.data)
-                if search:
-                    if key in search:
-                        if return_value:
-                            return {'key_to_check': k, 'value': {'search_key': key, 'search_key_value': search[key]}}
-                        return True
-                    continue
-                else:
-                    continue
-            return False
+                self.data.get(k)
+
+            section = self.locate(key)
+            if section is None or section not in keys_to_check:
+                return False
+            if return_value:
+                value = self.data[section][key]
+                return {'key_to_check': section, 'value': {'search_key': key, 'search_key_value': value}}
+            return True
         else:
-            search = deep_search(key, self.data)
+            self.materialize()
+            section = self.locate(key)
+            search = self.data[section][key] if section is not None else self.data.get(key)
             if search:
                 if return_value:
                     return search
@@ -117,8 +320,20 @@ class Database(Connection):
             return False
 
     async def displace_object(self, object_id: str, model) -> bool:
-        deep_delete(object_id, self.data)
-        self.data = deep_update(self.data, model.dict())
+        return await self.displace(object_id, model.dict())
+
+    async def displace(self, object_id: str, data: dict) -> bool:
+        self.remove(object_id)
+        self.merge(data)
+
+        if self.journal is not None:
+            self.journal.append((object_id, data))
+
+        if not self.read_only:
+            if self.wal is not None:
+                await self.log('displace', key=object_id, data=data)
+            self.mutated()
+
         return True
 
     def __del__(self):
@@ -0,0 +1,16 @@
+class CodecNotAvailable(Exception):
+    def __init__(
+            self,
+            message='Serialization codec is not installed',
+            *args,
+            **kwargs):
+        super().__init__(message)
+
+
+class UnknownFormat(Exception):
+    def __init__(
+            self,
+            message='Could not detect the database file format',
+            *args,
+            **kwargs):
+        super().__init__(message)
@@ -0,0 +1,120 @@
+import os
+import json
+import mmap
+
+from collections.abc import MutableMapping
+from conf.settings import DB_LAZY_MAX_SECTIONS
+
+
+def index_location(location: str) -> str:
+    return f'{location}.idx'
+
+
+def dumps_sections(codec, data: dict) -> tuple[bytes, dict | None]:
+    # binary codecs and flat files with thousands of top-level keys are written in one piece
+    if codec.binary or len(data) > DB_LAZY_MAX_SECTIONS:
+        return codec.dumps(data), None
+
+    chunks = [b'{']
+    offsets = {}
+    position = 1
+    for i, (key, value) in enumerate(data.items()):
+        head = (b', ' if i else b'') + codec.dumps(str(key)) + b': '
+        body = codec.dumps(value)
+        position += len(head)
+        offsets[str(key)] = (position, position + len(body))
+        position += len(body)
+        chunks += [head, body]
+    chunks.append(b'}')
+
+    return b''.join(chunks), offsets
+
+
+def write_index(location: str, offsets: dict | None):
+    if offsets is None:
+        if os.path.exists(index_location(location)):
+            os.remove(index_location(location))
+        return
+
+    stat = os.stat(location)
+    with open(index_location(location), mode='w', encoding='utf8') as f:
+        json.dump({'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'offsets': offsets}, f)
+
+
+def read_index(location: str, fileno: int) -> dict | None:
+    try:
+        with open(index_location(location), mode='r', encoding='utf8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    # an index left behind by another writer describes a different file
+    stat = os.fstat(fileno)
+    if index['size'] != stat.st_size or index['mtime_ns'] != stat.st_mtime_ns:
+        return None
+
+    return index['offsets']
+
+
+class LazyData(MutableMapping):
+    def __init__(self, fileno: int, offsets: dict, codec, on_load=None, use_mmap: bool = True):
+        self.fileno = fileno
+        self.offsets = dict(offsets)
+        self.codec = codec
+        self.on_load = on_load
+        self.loaded = {}
+        self.buffer = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ) if use_mmap else None
+
+    def read(self, start: int, end: int) -> bytes:
+        if self.buffer is not None:
+            return self.buffer[start:end]
+        return os.pread(self.fileno, end - start, start)
+
+    def __getitem__(self, key):
+        if key in self.loaded:
+            return self.loaded[key]
+
+        if key not in self.offsets:
+            raise KeyError(key)
+
+        value = self.codec.loads(self.read(*self.offsets.pop(key)))
+        self.loaded[key] = value
+        if self.on_load is not None:
+            self.on_load(key, value)
+
+        return value
+
+    def __setitem__(self, key, value):
+        self.offsets.pop(key, None)
+        self.loaded[key] = value
+
+    def __delitem__(self, key):
+        if key in self.loaded:
+            del self.loaded[key]
+        elif key in self.offsets:
+            del self.offsets[key]
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self.loaded or key in self.offsets
+
+    def __iter__(self):
+        return iter(list(self.loaded) + list(self.offsets))
+
+    def __len__(self):
+        return len(self.loaded) + len(self.offsets)
+
+    def clear(self):
+        self.loaded.clear()
+        self.offsets.clear()
+
+    def materialize(self) -> dict:
+        data = {key: self[key] for key in self}
+        self.close()
+        return data
+
+    def close(self):
+        if self.buffer is not None:
+            self.buffer.close()
+            self.buffer = None
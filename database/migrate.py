@@ -0,0 +1,47 @@
+import asyncio
+import argparse
+
+from pathlib import Path
+
+from database.database import Database
+from database.sqlite_database import SQLITE_SUFFIX
+from conf.settings import ALL_APPS_JSON_FILE, BOOSTER_PACKS_JSON_FILE
+
+
+async def migrate(location: str, codec: str) -> str:
+    db = await Database.connect(location=location, codec=codec)
+    await db.write()
+    await db.disconnect()
+
+    return db.codec.name
+
+
+async def migrate_to_sqlite(location: str, table: str = None) -> str:
+    sqlite_location = str(Path(location).with_suffix(SQLITE_SUFFIX))
+
+    db = await Database.connect(location=location, read_only=True)
+    sqlite_db = await Database.connect(location=sqlite_location, table=table)
+    await sqlite_db.save(await db.get_all())
+
+    await db.disconnect()
+    await sqlite_db.disconnect()
+
+    return sqlite_location
+
+
+async def main(locations: list, codec: str):
+    for location in locations:
+        if codec == 'sqlite':
+            name = await migrate_to_sqlite(location)
+        else:
+            name = await migrate(location, codec)
+        print(f'{location} -> {name}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rewrite database files with another serialization codec')
+    parser.add_argument('codec', choices=['json', 'orjson', 'msgpack', 'sqlite'])
+    parser.add_argument('locations', nargs='*', default=[str(ALL_APPS_JSON_FILE), str(BOOSTER_PACKS_JSON_FILE)])
+    args = parser.parse_args()
+
+    asyncio.run(main(args.locations, args.codec))
@@ -0,0 +1,231 @@
+import os
+import mmap
+import math
+
+from time import time
+from array import array
+from pathlib import Path
+from datetime import datetime, timezone
+from collections import defaultdict
+from conf.settings import PRICE_HISTORY_FOLDER
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# column -> array typecode, missing observations are stored as NaN
+COLUMNS = {
+    'app_id': 'I',
+    'timestamp': 'd',
+    'gems_price': 'd',
+    'cards_price': 'd',
+    'cards_profit': 'd',
+    'cards_volume': 'd',
+    'booster_price': 'd',
+    'booster_profit': 'd',
+    'booster_volume': 'd'
+}
+
+
+def to_float(value) -> float:
+    return float(value) if value is not None else math.nan
+
+
+class PriceHistory:
+    def __init__(self):
+        self.location = None
+        self.flush_every = None
+        self.pending = None
+
+    @classmethod
+    async def create(cls, location: Path = PRICE_HISTORY_FOLDER, flush_every: int = 1000):
+        self = cls()
+        self.location = Path(location)
+        self.flush_every = flush_every
+        self.location.mkdir(parents=True, exist_ok=True)
+        self.pending = {column: array(typecode) for column, typecode in COLUMNS.items()}
+
+        return self
+
+    def record(self, app_id: str | int, gems_price: float = None, cards_price: float = None,
+               cards_profit: float = None, cards_volume: int = None, booster_price: float = None,
+               booster_profit: float = None, booster_volume: int = None, timestamp: float = None):
+        row = {
+            'app_id': int(app_id),
+            'timestamp': timestamp if timestamp is not None else time(),
+            'gems_price': to_float(gems_price),
+            'cards_price': to_float(cards_price),
+            'cards_profit': to_float(cards_profit),
+            'cards_volume': to_float(cards_volume),
+            'booster_price': to_float(booster_price),
+            'booster_profit': to_float(booster_profit),
+            'booster_volume': to_float(booster_volume)
+        }
+        for column, value in row.items():
+            self.pending[column].append(value)
+
+        if len(self.pending['app_id']) >= self.flush_every:
+            self.flush()
+
+    def segment_path(self) -> Path:
+        # one segment per day and process, so sharded checkers never interleave their rows
+        day = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+        return self.location / f'{day}-{os.getpid()}'
+
+    def flush(self) -> int:
+        rows = len(self.pending['app_id'])
+        if not rows:
+            return 0
+
+        segment = self.segment_path()
+        segment.mkdir(exist_ok=True)
+        for column, values in self.pending.items():
+            with open(segment / f'{column}.bin', mode='ab') as f:
+                values.tofile(f)
+            del values[:]
+
+        return rows
+
+    async def close(self):
+        self.flush()
+
+    @staticmethod
+    def read_column(path: Path, typecode: str):
+        size = path.stat().st_size if path.exists() else 0
+        itemsize = array(typecode).itemsize
+        length = size // itemsize
+
+        if not length:
+            return numpy.empty(0, dtype=typecode) if numpy is not None else array(typecode)
+
+        if numpy is not None:
+            return numpy.memmap(path, dtype=typecode, mode='r', shape=(length,))
+
+        with open(path, mode='rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            values = array(typecode)
+            values.frombytes(buffer[:length * itemsize])
+            return values
+
+    def segments(self, since: float = None) -> list:
+        segments = sorted(path for path in self.location.iterdir() if path.is_dir())
+        if since is not None:
+            day = datetime.fromtimestamp(since, timezone.utc).strftime('%Y-%m-%d')
+            segments = [path for path in segments if path.name[:10] >= day]
+
+        return segments
+
+    def load(self, columns: tuple = tuple(COLUMNS), since: float = None) -> dict:
+        columns = {'app_id', 'timestamp', *columns}
+        loaded = {column: [] for column in columns}
+
+        for segment in self.segments(since):
+            parts = {column: self.read_column(segment / f'{column}.bin', COLUMNS[column]) for column in columns}
+            # a crash between column appends leaves the last row partially written
+            length = min(len(part) for part in parts.values())
+            for column, part in parts.items():
+                loaded[column].append(part[:length])
+
+        if numpy is not None:
+            data = {column: numpy.concatenate(parts) if parts else numpy.empty(0, dtype=COLUMNS[column])
+                    for column, parts in loaded.items()}
+            if since is not None:
+                mask = data['timestamp'] >= since
+                data = {column: values[mask] for column, values in data.items()}
+            return data
+
+        data = {column: array(COLUMNS[column]) for column in columns}
+        for column, parts in loaded.items():
+            for part in parts:
+                data[column].extend(part)
+        if since is not None:
+            keep = [i for i, t in enumerate(data['timestamp']) if t >= since]
+            data = {column: array(COLUMNS[column], (values[i] for i in keep)) for column, values in data.items()}
+
+        return data
+
+    # per app sums (n, x, y, xx, xy, yy) over its last `window` observations, x is the time in days
+    def window_sums(self, column: str, window: int, since: float = None) -> dict:
+        data = self.load(columns=(column,), since=since)
+        if not len(data['app_id']):
+            return {}
+
+        if numpy is not None:
+            return self.window_sums_vectorized(data['app_id'], data['timestamp'], data[column], window)
+
+        series = defaultdict(list)
+        for app_id, timestamp, value in zip(data['app_id'], data['timestamp'], data[column]):
+            if not math.isnan(value):
+                series[app_id].append((timestamp, value))
+
+        origin = min(data['timestamp'])
+        sums = {}
+        for app_id, points in series.items():
+            points = sorted(points)[-window:]
+            x = [(t - origin) / 86400 for t, _ in points]
+            y = [v for _, v in points]
+            sums[app_id] = (
+                len(points), sum(x), sum(y),
+                sum(i * i for i in x), sum(i * j for i, j in zip(x, y)), sum(j * j for j in y)
+            )
+
+        return sums
+
+    @staticmethod
+    def window_sums_vectorized(app_ids, timestamps, values, window: int) -> dict:
+        mask = ~numpy.isnan(values)
+        app_ids, timestamps, values = app_ids[mask], timestamps[mask], values[mask]
+        if not len(app_ids):
+            return {}
+
+        order = numpy.lexsort((timestamps, app_ids))
+        app_ids, timestamps, values = app_ids[order], timestamps[order], values[order]
+
+        apps, starts, counts = numpy.unique(app_ids, return_index=True, return_counts=True)
+        groups = numpy.repeat(numpy.arange(len(apps)), counts)
+
+        # position from the end of each app's series, only the newest `window` rows take part
+        from_end = numpy.repeat(starts + counts, counts) - numpy.arange(len(app_ids)) - 1
+        keep = from_end < window
+        groups, x, y = groups[keep], (timestamps[keep] - timestamps.min()) / 86400, values[keep]
+
+        def total(weights=None):
+            return numpy.bincount(groups, weights=weights, minlength=len(apps))
+
+        sums = zip(total(), total(x), total(y), total(x * x), total(x * y), total(y * y))
+        return {int(app_id): tuple(float(v) for v in s) for app_id, s in zip(apps, sums)}
+
+    def rolling(self, column: str = 'cards_profit', window: int = 7, since: float = None) -> dict:
+        stats = {}
+        for app_id, (n, sx, sy, sxx, sxy, syy) in self.window_sums(column, window, since).items():
+            if not n:
+                continue
+            mean = sy / n
+            variance = max(syy / n - mean * mean, 0.0)
+            denominator = n * sxx - sx * sx
+            stats[str(app_id)] = {
+                'observations': int(n),
+                'mean': round(mean, 4),
+                'volatility': round(math.sqrt(variance), 4),
+                # least squares slope of the value per day
+                'trend': round((n * sxy - sx * sy) / denominator, 4) if n > 1 and denominator > 1e-12 else 0.0
+            }
+
+        return stats
+
+    def moving_average(self, column: str = 'cards_profit', window: int = 7, since: float = None) -> dict:
+        return {app_id: s['mean'] for app_id, s in self.rolling(column, window, since).items()}
+
+    def volatility(self, column: str = 'cards_profit', window: int = 7, since: float = None) -> dict:
+        return {app_id: s['volatility'] for app_id, s in self.rolling(column, window, since).items()}
+
+    def trend(self, column: str = 'cards_profit', window: int = 7, since: float = None) -> dict:
+        return {app_id: s['trend'] for app_id, s in self.rolling(column, window, since).items()}
+
+    def stable(self, column: str = 'cards_profit', window: int = 7, min_mean: float = 0.0,
+               max_volatility: float = None, min_observations: int = 2) -> dict:
+        return {
+            app_id: s for app_id, s in self.rolling(column, window).items()
+            if s['observations'] >= min_observations and s['mean'] > min_mean and s['trend'] >= 0
+            and (max_volatility is None or s['volatility'] <= max_volatility)
+        }
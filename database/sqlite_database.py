@@ -0,0 +1,419 @@
+import json
+import asyncio
+import sqlite3
+
+from threading import RLock
+from functools import partial
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from io import UnsupportedOperation
+from os.path import basename
+
+SQLITE_SUFFIX = '.sqlite'
+
+TABLES = {
+    'apps': {
+        'key': 'app_id',
+        'section': 'app_set',
+        'columns': {
+            'app_name': 'TEXT',
+            'response': 'INTEGER',
+            'success': 'INTEGER',
+            'redirect': 'TEXT',
+            'app_type': 'TEXT',
+            'added': 'TEXT'
+        },
+        'indexes': ('app_set', 'added')
+    },
+    'boosters': {
+        'key': 'app_id',
+        'section': None,
+        'columns': {
+            'app_name': 'TEXT',
+            'gems_price': 'REAL',
+            'cards_profit': 'REAL',
+            'cards_volume': 'INTEGER',
+            'booster_profit': 'REAL',
+            'booster_volume': 'INTEGER',
+            'expensive_cards': 'INTEGER',
+            'expensive_cards_probability': 'REAL',
+            'added': 'TEXT'
+        },
+        'indexes': ('cards_profit', 'booster_profit', 'cards_volume', 'booster_volume', 'added')
+    },
+    'accounts': {
+        'key': 'login',
+        'section': None,
+        'columns': {
+            'steam_id': 'TEXT',
+            'api_key': 'TEXT',
+            'shared_secret': 'TEXT',
+            'apps_path': 'TEXT',
+            'currency': 'TEXT'
+        },
+        'indexes': ()
+    }
+}
+
+
+def infer_table(location: str) -> str:
+    name = basename(str(location)).lower()
+
+    if 'booster' in name:
+        return 'boosters'
+    if 'account' in name:
+        return 'accounts'
+
+    return 'apps'
+
+
+# the views keep the dict-like data attribute of the JSON databases working, but every access is a blocking
+# query on the caller's thread, so anything called per item should use the async methods instead
+class SectionView(Mapping):
+    def __init__(self, db: 'SQLiteDatabase', section: str):
+        self.db = db
+        self.section = section
+
+    def __getitem__(self, key):
+        row = self.db.fetch_row(key, section=self.section)
+        if row is None:
+            raise KeyError(key)
+        return row
+
+    def __iter__(self):
+        return iter(self.db.fetch_keys(section=self.section))
+
+    def __len__(self):
+        return self.db.count(section=self.section)
+
+    def __contains__(self, key):
+        return self.db.fetch_row(key, section=self.section) is not None
+
+    def items(self):
+        return self.db.fetch_rows(section=self.section).items()
+
+    def values(self):
+        return self.db.fetch_rows(section=self.section).values()
+
+
+class TableView(Mapping):
+    def __init__(self, db: 'SQLiteDatabase'):
+        self.db = db
+
+    def __getitem__(self, key):
+        if self.db.nested:
+            if key not in self.db.fetch_sections():
+                raise KeyError(key)
+            return SectionView(self.db, key)
+
+        row = self.db.fetch_row(key)
+        if row is None:
+            raise KeyError(key)
+        return row
+
+    def __iter__(self):
+        if self.db.nested:
+            return iter(self.db.fetch_sections())
+        return iter(self.db.fetch_keys())
+
+    def __len__(self):
+        if self.db.nested:
+            return len(self.db.fetch_sections())
+        return self.db.count()
+
+    def __contains__(self, key):
+        if self.db.nested:
+            return key in self.db.fetch_sections()
+        return self.db.fetch_row(key) is not None
+
+    def items(self):
+        if self.db.nested:
+            return [(section, SectionView(self.db, section)) for section in self.db.fetch_sections()]
+        return self.db.fetch_rows().items()
+
+    def clear(self):
+        self.db.check_writable()
+        self.db.execute(f'DELETE FROM {self.db.table}')
+
+
+class SQLiteDatabase:
+    def __init__(self):
+        self.location = None
+        self.read_only = None
+        self.table = None
+        self.schema = None
+        self.connection = None
+        self.executor = None
+        self.lock = RLock()
+        self.data = None
+        self.journal = None
+
+    @classmethod
+    async def connect(cls, location: str, read_only: bool = False, table: str = None):
+        self = cls()
+        self.location = location
+        self.read_only = read_only
+        self.table = table or infer_table(location)
+        self.schema = TABLES[self.table]
+
+        # statements of the async methods run on one dedicated thread, so sqlite3 never blocks the event loop
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'sqlite-{self.table}')
+        self.connection = await self.run(self.open_db)
+        self.data = TableView(self)
+
+        return self
+
+    @property
+    def nested(self) -> bool:
+        return self.schema['section'] is not None
+
+    @property
+    def columns(self) -> list:
+        return list(self.schema['columns'])
+
+    def open_db(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.location, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+
+        key = self.schema['key']
+        section = f'{self.schema["section"]} TEXT NOT NULL, ' if self.nested else ''
+        columns = ', '.join(f'{name} {column_type}' for name, column_type in self.schema['columns'].items())
+
+        connection.execute(
+            f'CREATE TABLE IF NOT EXISTS {self.table} ({section}{key} TEXT PRIMARY KEY, {columns}, extra TEXT)'
+        )
+        for column in self.schema['indexes']:
+            connection.execute(f'CREATE INDEX IF NOT EXISTS {self.table}_{column} ON {self.table} ({column})')
+        connection.commit()
+
+        return connection
+
+    async def run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+
+    def execute(self, sql: str, params: tuple = (), many: bool = False) -> sqlite3.Cursor:
+        with self.lock:
+            if many:
+                cursor = self.connection.executemany(sql, params)
+            else:
+                cursor = self.connection.execute(sql, params)
+            self.connection.commit()
+            return cursor
+
+    def query(self, sql: str, params: tuple = ()) -> list:
+        with self.lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    def check_writable(self):
+        if self.read_only:
+            raise UnsupportedOperation(f"{basename(str(self.location))} is not writable")
+
+    def row_to_dict(self, row: tuple) -> dict:
+        fields = dict(zip(self.columns, row))
+        if row[-1]:
+            fields.update(json.loads(row[-1]))
+        return fields
+
+    def select(self) -> str:
+        return ', '.join(self.columns + ['extra'])
+
+    def fetch_row(self, key: str, section: str = None) -> dict | None:
+        where, params = f'{self.schema["key"]} = ?', (key,)
+        if section is not None:
+            where, params = f'{where} AND {self.schema["section"]} = ?', (key, section)
+
+        rows = self.query(f'SELECT {self.select()} FROM {self.table} WHERE {where}', params)
+        return self.row_to_dict(rows[0]) if rows else None
+
+    def fetch_rows(self, section: str = None) -> dict:
+        key = self.schema['key']
+        if section is not None:
+            rows = self.query(
+                f'SELECT {key}, {self.select()} FROM {self.table} WHERE {self.schema["section"]} = ?', (section,)
+            )
+        else:
+            rows = self.query(f'SELECT {key}, {self.select()} FROM {self.table}')
+
+        return {row[0]: self.row_to_dict(row[1:]) for row in rows}
+
+    def fetch_keys(self, section: str = None) -> list:
+        key = self.schema['key']
+        if section is not None:
+            rows = self.query(f'SELECT {key} FROM {self.table} WHERE {self.schema["section"]} = ?', (section,))
+        else:
+            rows = self.query(f'SELECT {key} FROM {self.table}')
+
+        return [row[0] for row in rows]
+
+    def fetch_sections(self) -> list:
+        section = self.schema['section']
+        return [row[0] for row in self.query(f'SELECT DISTINCT {section} FROM {self.table}')]
+
+    def fetch_section_sizes(self) -> dict:
+        if not self.nested:
+            return {}
+
+        section = self.schema['section']
+        return dict(self.query(f'SELECT {section}, COUNT(*) FROM {self.table} GROUP BY {section}'))
+
+    def fetch_location(self, key: str) -> tuple | None:
+        if not self.nested:
+            row = self.fetch_row(key)
+            return (None, row) if row is not None else None
+
+        rows = self.query(
+            f'SELECT {self.schema["section"]}, {self.select()} FROM {self.table} WHERE {self.schema["key"]} = ?',
+            (key,)
+        )
+        return (rows[0][0], self.row_to_dict(rows[0][1:])) if rows else None
+
+    def count(self, section: str = None) -> int:
+        if section is not None:
+            sql, params = f'SELECT COUNT(*) FROM {self.table} WHERE {self.schema["section"]} = ?', (section,)
+        else:
+            sql, params = f'SELECT COUNT(*) FROM {self.table}', ()
+
+        return self.query(sql, params)[0][0]
+
+    def flatten(self, data: dict) -> list:
+        if not self.nested:
+            return [(None, key, fields) for key, fields in data.items()]
+
+        return [(section, key, fields) for section, items in data.items() for key, fields in items.items()]
+
+    def upsert(self, rows: list):
+        key = self.schema['key']
+        section = self.schema['section']
+
+        for row_section, row_key, fields in rows:
+            known = {k: v for k, v in fields.items() if k in self.schema['columns']}
+            extra = {k: v for k, v in fields.items() if k not in self.schema['columns']}
+
+            columns = ([section] if self.nested else []) + [key] + list(known) + ['extra']
+            values = ([row_section] if self.nested else []) + [row_key] + list(known.values())
+            values.append(json.dumps(extra) if extra else None)
+
+            # only the given columns are overwritten, the same way deep_update merges a JSON record
+            updates = [f'{column} = excluded.{column}' for column in columns if column not in (key, 'extra')]
+            updates.append("extra = json_patch(coalesce(extra, '{}'), coalesce(excluded.extra, '{}'))")
+
+            self.connection.execute(
+                f'INSERT INTO {self.table} ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))}) '
+                f'ON CONFLICT({key}) DO UPDATE SET {", ".join(updates)}',
+                values
+            )
+
+    def save_rows(self, data: dict, displaced: str = None):
+        with self.lock:
+            if displaced is not None:
+                self.connection.execute(f'DELETE FROM {self.table} WHERE {self.schema["key"]} = ?', (displaced,))
+            self.upsert(self.flatten(data))
+            self.connection.commit()
+
+    def delete_key(self, key: str) -> int:
+        column = self.schema['section'] if self.nested else self.schema['key']
+        return self.execute(f'DELETE FROM {self.table} WHERE {column} = ?', (key,)).rowcount
+
+    async def get(self, key: str, default=None):
+        if self.nested:
+            rows = await self.run(self.fetch_rows, section=key)
+            return rows if rows else default
+
+        row = await self.run(self.fetch_row, key)
+        return row if row is not None else default
+
+    async def get_many(self, keys: list) -> list:
+        return [await self.get(key) for key in keys]
+
+    async def get_all(self) -> dict:
+        if self.nested:
+            return {section: await self.get(section) for section in await self.run(self.fetch_sections)}
+
+        return await self.run(self.fetch_rows)
+
+    async def section_sizes(self) -> dict:
+        return await self.run(self.fetch_section_sizes)
+
+    async def top(self, column: str, limit: int = 100, descending: bool = True, section: str = None) -> dict:
+        if column not in self.schema['columns']:
+            raise KeyError(column)
+
+        key = self.schema['key']
+        where, params = ('', ()) if section is None else (f'WHERE {self.schema["section"]} = ?', (section,))
+        order = 'DESC' if descending else 'ASC'
+
+        rows = await self.run(
+            self.query,
+            f'SELECT {key}, {self.select()} FROM {self.table} {where} '
+            f'ORDER BY {column} IS NULL, {column} {order} LIMIT ?',
+            (*params, limit)
+        )
+
+        return {row[0]: self.row_to_dict(row[1:]) for row in rows}
+
+    async def delete(self, key) -> bool:
+        self.check_writable()
+        if not await self.run(self.delete_key, key):
+            raise KeyError(key)
+        return True
+
+    async def save(self, data) -> bool:
+        self.check_writable()
+        await self.run(self.save_rows, data)
+        return True
+
+    async def is_cached(self, key: str, keys_to_check: tuple = None, return_value: bool = False):
+        if keys_to_check is not None:
+            location = await self.run(self.fetch_location, key)
+            if location is None or (self.nested and location[0] not in keys_to_check):
+                return False
+            if return_value:
+                return {'key_to_check': location[0], 'value': {'search_key': key, 'search_key_value': location[1]}}
+            return True
+
+        if self.nested and key in await self.run(self.fetch_sections):
+            value = await self.get(key)
+        else:
+            location = await self.run(self.fetch_location, key)
+            value = location[1] if location is not None else None
+
+        if value:
+            return value if return_value else True
+        return False
+
+    async def displace_object(self, object_id: str, model) -> bool:
+        return await self.displace(object_id, model.dict())
+
+    async def displace(self, object_id: str, data: dict) -> bool:
+        if self.journal is not None:
+            self.journal.append((object_id, data))
+
+        # a read-only shard only reports its mutations, the parent process applies them
+        if self.read_only and self.journal is not None:
+            return True
+
+        self.check_writable()
+        await self.run(self.save_rows, data, displaced=object_id)
+        return True
+
+    async def write(self) -> bool:
+        self.check_writable()
+        return True
+
+    # every mutation is already committed, there is nothing to checkpoint
+    def start_checkpoints(self, *args, **kwargs):
+        pass
+
+    async def stop_checkpoints(self):
+        pass
+
+    async def disconnect(self):
+        if self.connection is not None:
+            await self.run(self.connection.close)
+            self.connection = None
+            self.executor.shutdown(wait=False)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}("{self.location}", table="{self.table}")'
@@ -61,6 +61,15 @@ def deep_delete(key, mapping):
     return None
 
 
+def deep_merge(mapping: dict, update: dict) -> dict:
+    for k, v in update.items():
+        if k in mapping and isinstance(mapping[k], dict) and isinstance(v, dict):
+            deep_merge(mapping[k], v)
+        else:
+            mapping[k] = v
+    return mapping
+
+
 def list_json_files(json_files_dir) -> dict:
     json_files = {f: abspath(join(json_files_dir, f)) for f in listdir(json_files_dir)
                   if isfile(join(json_files_dir, f)) and f.endswith(".json")}
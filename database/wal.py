@@ -0,0 +1,62 @@
+import os
+import aiofiles
+
+from database.codec import JSON
+from conf.settings import LOGS
+
+
+class WriteAheadLog:
+    def __init__(self):
+        self.location = None
+        self.file = None
+        self.size = 0
+        self.records = 0
+
+    @classmethod
+    async def open(cls, location: str, read_only: bool = False):
+        self = cls()
+        self.location = location
+        self.file = await aiofiles.open(self.location, mode='rb' if read_only else 'ab+')
+        await self.file.seek(0, os.SEEK_END)
+        self.size = await self.file.tell()
+        return self
+
+    async def read(self) -> list:
+        await self.file.seek(0)
+        lines = (await self.file.read()).splitlines()
+
+        records = []
+        for i, line in enumerate(lines):
+            try:
+                records.append(JSON.loads(line))
+            except ValueError:
+                # only the last record can be torn by a crash, anything else is corruption
+                if i != len(lines) - 1:
+                    raise
+                LOGS['stdout_error'].error(f'Skipping torn record at the end of "{self.location}"')
+
+        self.records = len(records)
+
+        return records
+
+    async def append(self, op: str, key: str = None, data: dict = None):
+        record = JSON.dumps({'op': op, 'key': key, 'data': data}) + b'\n'
+        await self.file.write(record)
+        await self.file.flush()
+        self.size += len(record)
+        self.records += 1
+
+    async def sync(self):
+        await self.file.flush()
+        os.fsync(self.file.fileno())
+
+    async def truncate(self):
+        await self.file.truncate(0)
+        await self.sync()
+        self.size = 0
+        self.records = 0
+
+    async def close(self):
+        if self.file is not None:
+            await self.file.close()
+            self.file = None
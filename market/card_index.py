@@ -0,0 +1,31 @@
+from collections import defaultdict
+from market.models import MarketItem
+from typing import List, Union
+
+
+class CardIndex:
+    def __init__(self):
+        self.apps = defaultdict(dict)
+        self.complete = False
+
+    @staticmethod
+    def app_id(market_item: MarketItem) -> Union[str, None]:
+        # cards of every game are listed under the Steam app as "{app_id}-{card name}"
+        app_id = market_item.market_hash_name.split('-', 1)[0]
+        return app_id if app_id.isdigit() else None
+
+    def add(self, market_item: MarketItem):
+        app_id = self.app_id(market_item)
+        if app_id is not None:
+            # listings move between pages while the market is crawled, a card seen twice is kept once
+            self.apps[app_id][market_item.market_hash_name] = market_item
+
+    def cards(self, app_id: str) -> Union[List[MarketItem], None]:
+        cards = self.apps.get(str(app_id))
+        return list(cards.values()) if cards else None
+
+    def __contains__(self, app_id: str) -> bool:
+        return str(app_id) in self.apps
+
+    def __len__(self) -> int:
+        return len(self.apps)
@@ -0,0 +1,138 @@
+import re
+import asyncio
+import statistics
+
+from time import time
+from conf.settings import FX_REFERENCE_ITEMS, FX_TTL
+from market.models import Currency, MarketCategory
+from market.exceptions import NoSuchCurrency, ExchangeRateUnavailable
+from typing import Union
+
+# currencies Steam prints with a decimal comma, everything else not listed uses a decimal point
+DECIMAL_COMMA = {
+    Currency.EURO, Currency.RUB, Currency.PLN, Currency.BRL, Currency.NOK,
+    Currency.TRY, Currency.UAH, Currency.COP
+}
+# currencies Steam prints without a fractional part, any separator in them groups thousands
+NO_DECIMALS = {Currency.JPY, Currency.IDR, Currency.VND, Currency.KRW, Currency.CLP}
+
+
+def get_currency(currency: Union[Currency, str, int, None]) -> Currency:
+    if isinstance(currency, Currency):
+        return currency
+
+    try:
+        if isinstance(currency, int) or (isinstance(currency, str) and currency.isdigit()):
+            return Currency(int(currency))
+        return Currency[str(currency).upper()]
+    except (KeyError, ValueError):
+        raise NoSuchCurrency(f'No such currency: {currency}')
+
+
+def parse_price(price: str, currency: Currency = None) -> Union[float, None]:
+    if price is None:
+        return None
+
+    # "12,--€" is how whole amounts are written in some locales
+    number = re.sub(r'[^\d.,]', '', price.replace('--', '00')).strip('.,')
+    if not number:
+        return None
+
+    if currency in NO_DECIMALS:
+        return float(re.sub(r'[.,]', '', number))
+
+    if currency is not None:
+        decimal = ',' if currency in DECIMAL_COMMA else '.'
+    else:
+        decimal = guess_decimal(number)
+
+    thousands = ',' if decimal == '.' else '.'
+    number = number.replace(thousands, '')
+    if decimal is not None:
+        number = number.replace(decimal, '.')
+
+    return float(number)
+
+
+def guess_decimal(number: str) -> Union[str, None]:
+    last = max(number.rfind('.'), number.rfind(','))
+    if last == -1:
+        return None
+
+    separator = number[last]
+    # with both separators the last one is decimal, a lone one is decimal unless it groups three digits
+    if '.' in number and ',' in number:
+        return separator
+    if number.count(separator) > 1 or len(number) - last - 1 == 3:
+        return ',' if separator == '.' else '.'
+
+    return separator
+
+
+class CurrencyConverter:
+    def __init__(self):
+        self.market_handler = None
+        self.reference_items = None
+        self.ttl = None
+        self.rates = {}
+
+    @classmethod
+    async def create(cls, market_handler, reference_items: list = None, ttl: int = FX_TTL):
+        self = cls()
+        self.market_handler = market_handler
+        self.reference_items = reference_items if reference_items is not None else FX_REFERENCE_ITEMS
+        self.ttl = ttl
+
+        return self
+
+    async def quote(self, market_game: int, market_hash_name: str, currency: Currency) -> Union[float, None]:
+        try:
+            market_item = await self.market_handler.get_price_overview(
+                market_hash_name=market_hash_name,
+                market_game=MarketCategory(market_game),
+                currency=currency
+            )
+        except Exception:
+            return None
+
+        price = float(market_item.lowest_price or 0) if market_item.success else 0
+        return price if price > 0 else None
+
+    async def get_rate(self, currency: Union[Currency, str, int]) -> float:
+        currency = get_currency(currency)
+        if currency == Currency.USD:
+            return 1.0
+
+        cached = self.rates.get(currency)
+        if cached is not None and time() - cached[1] < self.ttl:
+            return cached[0]
+
+        quotes = await asyncio.gather(*[
+            self.quote(market_game, market_hash_name, quote_currency)
+            for market_game, market_hash_name in self.reference_items
+            for quote_currency in (Currency.USD, currency)
+        ])
+
+        # units of the currency per dollar, the median keeps one badly listed item from skewing it
+        ratios = [
+            local / usd for usd, local in zip(quotes[::2], quotes[1::2])
+            if usd is not None and local is not None
+        ]
+        if not ratios:
+            raise ExchangeRateUnavailable(currency.name)
+
+        rate = statistics.median(ratios)
+        self.rates[currency] = (rate, time())
+
+        return rate
+
+    async def get_rates(self, currencies: list) -> dict:
+        rates = await asyncio.gather(*[self.get_rate(currency) for currency in currencies])
+        return {get_currency(currency): rate for currency, rate in zip(currencies, rates)}
+
+    async def convert(self, amount: Union[float, None], currency: Union[Currency, str, int],
+                      from_currency: Union[Currency, str, int] = Currency.USD) -> Union[float, None]:
+        if amount is None:
+            return None
+
+        return amount * await self.get_rate(currency) / await self.get_rate(from_currency)
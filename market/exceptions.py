@@ -5,3 +5,23 @@ class NoSuchCurrency(Exception):
             *args,
             **kwargs):
         super().__init__(message)
+
+
+class ItemNameIdNotFound(Exception):
+    def __init__(
+            self,
+            market_hash_name: str = None,
+            message='No item_nameid on the listing page',
+            *args,
+            **kwargs):
+        super().__init__(f'{message}: {market_hash_name}' if market_hash_name else message)
+
+
+class ExchangeRateUnavailable(Exception):
+    def __init__(
+            self,
+            currency: str = None,
+            message='No reference item is priced in this currency',
+            *args,
+            **kwargs):
+        super().__init__(f'{message}: {currency}' if currency else message)
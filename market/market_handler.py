@@ -1,8 +1,18 @@
+import re
+import asyncio
+
+from urllib.parse import quote
 from request_handler.requests_handler import RequestHandler
-from conf.settings import WORKERS_AMOUNT, TIMEOUT_MARKET, MARKET_PRICE_OVERVIEW_URL, MARKET_SEARCH_URL
-from market.models import MarketCategory, MarketItemPrice, Currency, MarketItem, ItemClass, CardBorder, DropRate
+from conf.settings import WORKERS_AMOUNT, TIMEOUT_MARKET, MARKET_PRICE_OVERVIEW_URL, MARKET_SEARCH_URL, LOGS, \
+    MARKET_LISTINGS_URL, MARKET_ORDERS_HISTOGRAM_URL, ITEM_NAMEIDS_JSON_FILE
+from database.database import Database
+from market.exceptions import ItemNameIdNotFound
+from market.models import MarketCategory, MarketItemPrice, Currency, MarketItem, ItemClass, CardBorder, DropRate, \
+    BoosterListing, OrderBook
 from market.utils import extract_price, convert_comma_to_int, dict_none_filter
-from typing import List, Union
+from market.card_index import CardIndex
+from market.price_cache import PriceCache
+from typing import List, Union, Tuple, Dict, AsyncIterator
 
 
 class MarketHandler:
@@ -13,14 +23,19 @@ class MarketHandler:
         self.db = None
         self.requests_handler = None
         self.client_session = None
+        self.requests_handler_owner = False
         self.apps_db = None
         self.apps_amount = None
         self.apps = None
+        self.card_index = None
+        self.price_cache = None
+        self.nameids_db = None
+        self.nameids_lock = asyncio.Lock()
 
     @classmethod
     async def create(cls, workers_amount: int = WORKERS_AMOUNT,
                      timeout: int = TIMEOUT_MARKET, proxy: bool = False,
-                     requests_handler: RequestHandler = None):
+                     requests_handler: RequestHandler = None, price_cache: bool | PriceCache = True):
         self = cls()
 
         self.proxy = proxy
@@ -28,6 +43,7 @@ class MarketHandler:
         self.timeout = timeout
 
         if requests_handler is None:
+            self.requests_handler_owner = True
             self.requests_handler = await RequestHandler.create(
                 proxy=self.proxy,
                 workers_amount=self.workers_amount,
@@ -36,18 +52,41 @@ class MarketHandler:
         else:
             self.requests_handler = requests_handler
 
+        if isinstance(price_cache, PriceCache):
+            self.price_cache = price_cache
+        elif price_cache:
+            self.price_cache = await PriceCache.get_shared()
+
         return self
 
+    async def close(self):
+        if self.price_cache is not None:
+            self.price_cache.save()
+
+        if self.nameids_db is not None:
+            await self.nameids_db.write()
+            await self.nameids_db.disconnect()
+            self.nameids_db = None
+
+        if self.requests_handler_owner:
+            await self.requests_handler.close()
+
     async def get_price_overview(
             self,
             market_hash_name: str,
             market_game: MarketCategory = MarketCategory.STEAM,
             currency: Currency = Currency.USD,
-            client_session: callable = None
+            client_session: callable = None,
+            use_cache: bool = True
     ) -> MarketItemPrice:
 
+        if use_cache and self.price_cache is not None:
+            market_item = self.price_cache.get(market_game, market_hash_name, currency)
+            if market_item is not None:
+                return market_item
+
         if client_session is None:
-            client_session = await self.requests_handler.create_session()
+            client_session = await self.requests_handler.get_session()
 
         params = {
             'currency': currency.value,
@@ -67,17 +106,20 @@ class MarketHandler:
 
         market_item = MarketItemPrice(
             success=response_market['success'],
-            lowest_price=await extract_price(response_market['lowest_price']),
+            lowest_price=await extract_price(response_market['lowest_price'], currency=currency),
             volume=await convert_comma_to_int(response_market['volume']),
-            median_price=await extract_price(response_market['median_price']),
+            median_price=await extract_price(response_market['median_price'], currency=currency),
             currency=Currency(currency.value).name,
             currency_num=currency.value
         )
 
+        if market_item.success and self.price_cache is not None:
+            self.price_cache.set(market_game, market_hash_name, currency, market_item)
+
         return market_item
 
-    async def market_search(
-            self,
+    @staticmethod
+    async def search_params(
             category: MarketCategory = MarketCategory.STEAM,
             start: int = 0,
             count: int = 100,
@@ -89,12 +131,8 @@ class MarketHandler:
             tag_droprate: DropRate = None,
             sort_dir: str = 'asc',
             search_descriptions: int = 0,
-            query: str = None,
-            client_session: callable = None
-    ) -> Union[None, List[MarketItem]]:
-        if client_session is None:
-            client_session = await self.requests_handler.create_session()
-
+            query: str = None
+    ) -> dict:
         params = {
             'start': start,
             'count': count,
@@ -110,33 +148,248 @@ class MarketHandler:
             'query': query
         }
 
+        return await dict_none_filter(params)
+
+    async def search_page(self, params: dict, client_session: callable = None) -> Tuple[List[MarketItem], int]:
+        if client_session is None:
+            client_session = await self.requests_handler.get_session()
+
         response_market = await self.requests_handler.request_handler(
             session=client_session,
             url=MARKET_SEARCH_URL,
-            params=await dict_none_filter(params)
+            params=params
         )
 
         results = []
-        if response_market['results']:
-            for item in response_market['results']:
-                market_item = MarketItem(
-                    appid=item['asset_description']['appid'],
-                    classid=item['asset_description']['classid'],
-                    instanceid=item['asset_description']['instanceid'],
-                    tradable=item['asset_description']['tradable'],
-                    name=item['asset_description']['name'],
-                    market_name=item['asset_description']['market_name'],
-                    market_hash_name=item['asset_description']['market_hash_name'],
-                    type=item['asset_description']['type'],
-                    commodity=item['asset_description']['commodity'],
-                    sell_price_text=item['sell_price_text'],
-                    sell_listings=item['sell_listings'],
-                )
-                results.append(market_item)
-
-            return results
-
-        return None
+        for item in response_market.get('results') or []:
+            market_item = MarketItem(
+                appid=item['asset_description']['appid'],
+                classid=item['asset_description']['classid'],
+                instanceid=item['asset_description']['instanceid'],
+                tradable=item['asset_description']['tradable'],
+                name=item['asset_description']['name'],
+                market_name=item['asset_description']['market_name'],
+                market_hash_name=item['asset_description']['market_hash_name'],
+                type=item['asset_description']['type'],
+                commodity=item['asset_description']['commodity'],
+                sell_price_text=item['sell_price_text'],
+                sell_listings=item['sell_listings'],
+            )
+            results.append(market_item)
+
+        return results, response_market.get('total_count') or 0
+
+    async def market_search(
+            self,
+            category: MarketCategory = MarketCategory.STEAM,
+            start: int = 0,
+            count: int = 100,
+            no_render: int = 1,
+            sort_column: str = None,
+            tag_app: str = None,
+            tag_item_class: ItemClass = None,
+            tag_cardborder: CardBorder = None,
+            tag_droprate: DropRate = None,
+            sort_dir: str = 'asc',
+            search_descriptions: int = 0,
+            query: str = None,
+            client_session: callable = None
+    ) -> Union[None, List[MarketItem]]:
+        params = await self.search_params(
+            category=category,
+            start=start,
+            count=count,
+            no_render=no_render,
+            sort_column=sort_column,
+            tag_app=tag_app,
+            tag_item_class=tag_item_class,
+            tag_cardborder=tag_cardborder,
+            tag_droprate=tag_droprate,
+            sort_dir=sort_dir,
+            search_descriptions=search_descriptions,
+            query=query
+        )
+
+        results, _ = await self.search_page(params=params, client_session=client_session)
+
+        return results or None
+
+    async def iter_market_search(self, page_size: int = 100, sort_column: str = 'name', failed: list = None,
+                                 **filters) -> AsyncIterator[MarketItem]:
+        params = await self.search_params(start=0, count=page_size, sort_column=sort_column, **filters)
+
+        results, total_count = await self.search_page(params=params)
+        for market_item in results:
+            yield market_item
+
+        # the first page tells how many there are, the rest is fetched a few pages at a time
+        starts = list(range(page_size, total_count, page_size))
+        for i in range(0, len(starts), self.workers_amount):
+            pages = await asyncio.gather(
+                *[self.search_page(params={**params, 'start': start}) for start in starts[i:i + self.workers_amount]],
+                return_exceptions=True
+            )
+            for start, page in zip(starts[i:i + self.workers_amount], pages):
+                if isinstance(page, Exception):
+                    LOGS['stdout_error'].error(f'MARKET SEARCH PAGE {start} of {total_count} FAILED: {page!r}')
+                    if failed is not None:
+                        failed.append(start)
+                    continue
+                for market_item in page[0]:
+                    yield market_item
+
+    async def booster_prices(self, page_size: int = 100) -> Dict[str, BoosterListing]:
+        boosters = {}
+        async for market_item in self.iter_market_search(page_size=page_size, tag_item_class=ItemClass.Booster):
+            # booster packs are listed as "{app_id}-{app_name} Booster Pack"
+            app_id = market_item.market_hash_name.split('-', 1)[0]
+            if not app_id.isdigit():
+                continue
+
+            boosters[app_id] = BoosterListing(
+                app_id=app_id,
+                market_hash_name=market_item.market_hash_name,
+                price=await extract_price(market_item.sell_price_text),
+                listings=market_item.sell_listings
+            )
+
+        return boosters
+
+    async def crawl_cards(self, page_size: int = 100) -> CardIndex:
+        card_index = CardIndex()
+        failed = []
+
+        async for market_item in self.iter_market_search(
+                page_size=page_size,
+                tag_item_class=ItemClass.Card,
+                tag_cardborder=CardBorder.Normal,
+                failed=failed
+        ):
+            card_index.add(market_item)
+
+        card_index.complete = not failed
+        self.card_index = card_index
+
+        LOGS['stdout_info'].info(
+            f'CARD INDEX: {len(card_index)} apps - '
+            f'FAILED PAGES: {len(failed)}'
+        )
+
+        return card_index
+
+    async def get_app_cards(self, app_id: str, client_session: callable = None) -> Union[None, List[MarketItem]]:
+        if self.card_index is not None:
+            cards = self.card_index.cards(app_id)
+            # an app missing from a partial crawl may sit on one of the failed pages
+            if cards is not None or self.card_index.complete:
+                return cards
+
+        return await self.market_search(
+            client_session=client_session,
+            tag_app=app_id,
+            tag_item_class=ItemClass.Card,
+            tag_cardborder=CardBorder.Normal
+        )
+
+    async def get_item_nameid(self, market_hash_name: str, market_game: MarketCategory = MarketCategory.STEAM,
+                              client_session: callable = None) -> str:
+        # the id of an item never changes, it is resolved from the listing page once and kept for good
+        async with self.nameids_lock:
+            if self.nameids_db is None:
+                # a killed run keeps every id it resolved, each one is a single appended log record
+                self.nameids_db = await Database.connect(location=str(ITEM_NAMEIDS_JSON_FILE), wal=True)
+
+        key = f'{market_game.value}/{market_hash_name}'
+        item_nameid = await self.nameids_db.get(key)
+        if item_nameid is not None:
+            return item_nameid
+
+        if client_session is None:
+            client_session = await self.requests_handler.get_session()
+
+        listing_page = await self.requests_handler.request_handler(
+            session=client_session,
+            url=f'{MARKET_LISTINGS_URL}{market_game.value}/{quote(market_hash_name)}',
+            json=False
+        )
+
+        match = re.search(r'Market_LoadOrderSpread\(\s*(\d+)\s*\)', listing_page)
+        if match is None:
+            raise ItemNameIdNotFound(market_hash_name)
+
+        item_nameid = match.group(1)
+        await self.nameids_db.displace(object_id=key, data={key: item_nameid})
+
+        return item_nameid
+
+    async def get_order_book(
+            self,
+            market_hash_name: str,
+            market_game: MarketCategory = MarketCategory.STEAM,
+            currency: Currency = Currency.USD,
+            client_session: callable = None
+    ) -> OrderBook:
+        if client_session is None:
+            client_session = await self.requests_handler.get_session()
+
+        item_nameid = await self.get_item_nameid(
+            market_hash_name=market_hash_name,
+            market_game=market_game,
+            client_session=client_session
+        )
+
+        params = {
+            'country': 'US',
+            'language': 'english',
+            'currency': currency.value,
+            'item_nameid': item_nameid,
+            'two_factor': 0,
+            'norender': 1
+        }
+
+        response_market = await self.requests_handler.request_handler(
+            session=client_session,
+            url=MARKET_ORDERS_HISTOGRAM_URL,
+            params=params
+        )
+
+        highest_buy_order = response_market.get('highest_buy_order')
+        lowest_sell_order = response_market.get('lowest_sell_order')
+
+        return OrderBook(
+            market_hash_name=market_hash_name,
+            item_nameid=item_nameid,
+            currency=Currency(currency.value).name,
+            # the histogram reports the best prices in cents
+            highest_buy_order=int(highest_buy_order) / 100 if highest_buy_order else None,
+            lowest_sell_order=int(lowest_sell_order) / 100 if lowest_sell_order else None,
+            buy_order_graph=[[p, q] for p, q, *_ in response_market.get('buy_order_graph') or []],
+            sell_order_graph=[[p, q] for p, q, *_ in response_market.get('sell_order_graph') or []]
+        )
+
+    async def get_order_books(
+            self,
+            market_hash_names: List[str],
+            market_game: MarketCategory = MarketCategory.STEAM,
+            currency: Currency = Currency.USD
+    ) -> Dict[str, OrderBook]:
+        order_books = {}
+
+        for i in range(0, len(market_hash_names), self.workers_amount):
+            batch = market_hash_names[i:i + self.workers_amount]
+            results = await asyncio.gather(
+                *[self.get_order_book(market_hash_name=name, market_game=market_game, currency=currency)
+                  for name in batch],
+                return_exceptions=True
+            )
+
+            for market_hash_name, order_book in zip(batch, results):
+                if isinstance(order_book, Exception):
+                    LOGS['stdout_error'].error(f'ORDER BOOK {market_hash_name} FAILED: {order_book!r}')
+                    continue
+                order_books[market_hash_name] = order_book
+
+        return order_books
 
     async def create_buy_order(self):
         pass
@@ -25,6 +25,40 @@ class MarketItem(BaseModel):
     sell_listings: int
 
 
+class BoosterListing(BaseModel):
+    app_id: str
+    market_hash_name: str
+    price: float = Field(default=None)
+    listings: int = Field(default=None)
+
+
+class OrderBook(BaseModel):
+    market_hash_name: str
+    item_nameid: str
+    currency: str
+    highest_buy_order: float = Field(default=None)
+    lowest_sell_order: float = Field(default=None)
+    # [price, cumulative quantity], buy orders from the highest price down, sell orders from the lowest up
+    buy_order_graph: list = Field(default_factory=list)
+    sell_order_graph: list = Field(default_factory=list)
+
+    def buy_depth(self, min_price: float) -> int:
+        depth = 0
+        for price, quantity in self.buy_order_graph:
+            if price < min_price:
+                break
+            depth = quantity
+        return depth
+
+    def sell_depth(self, max_price: float) -> int:
+        depth = 0
+        for price, quantity in self.sell_order_graph:
+            if price > max_price:
+                break
+            depth = quantity
+        return depth
+
+
 class MarketCategory(enum.IntEnum):
     STEAM = 753,
     DOTA2 = 570,
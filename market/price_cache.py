@@ -0,0 +1,138 @@
+import os
+import json
+
+from time import time
+from uuid import uuid4
+from pathlib import Path
+from collections import OrderedDict
+from conf.settings import PRICE_CACHE_TTL, PRICE_CACHE_TTLS, PRICE_CACHE_MAX_SIZE, PRICE_CACHE_FILE, LOGS
+from market.models import MarketCategory, MarketItemPrice, Currency
+
+
+class PriceCache:
+    shared = None
+
+    def __init__(self):
+        self.ttl = None
+        self.ttls = None
+        self.max_size = None
+        self.location = None
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    @classmethod
+    async def create(cls, ttl: int = PRICE_CACHE_TTL, ttls: dict = None, max_size: int = PRICE_CACHE_MAX_SIZE,
+                     location: Path = PRICE_CACHE_FILE):
+        self = cls()
+        self.ttl = ttl
+        self.ttls = ttls if ttls is not None else PRICE_CACHE_TTLS
+        self.max_size = max_size
+        self.location = Path(location) if location is not None else None
+
+        if self.location is not None:
+            self.load()
+
+        return self
+
+    @classmethod
+    async def get_shared(cls):
+        # one cache per process, so every handler and every run in it reuses the same quotes
+        if cls.shared is None:
+            cls.shared = await cls.create()
+        return cls.shared
+
+    @staticmethod
+    def key(market_game: MarketCategory, market_hash_name: str, currency: Currency) -> str:
+        return f'{int(market_game)}:{int(currency)}:{market_hash_name}'
+
+    def get_ttl(self, market_hash_name: str) -> int:
+        return self.ttls.get(market_hash_name, self.ttl)
+
+    def get(self, market_game: MarketCategory, market_hash_name: str, currency: Currency) -> MarketItemPrice | None:
+        key = self.key(market_game, market_hash_name, currency)
+        entry = self.entries.get(key)
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        if time() - entry['stored_at'] >= self.get_ttl(market_hash_name):
+            del self.entries[key]
+            self.expired += 1
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+
+        return MarketItemPrice(**entry['price'])
+
+    def set(self, market_game: MarketCategory, market_hash_name: str, currency: Currency, price: MarketItemPrice):
+        key = self.key(market_game, market_hash_name, currency)
+        self.entries[key] = {'stored_at': time(), 'price': price.dict()}
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def load(self):
+        try:
+            with open(self.location, mode='r', encoding='utf8') as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError):
+            LOGS['stdout_error'].error(f'Price cache "{self.location}" is unreadable, starting empty')
+            return
+
+        # the file is kept in LRU order, the newest quotes survive a smaller max_size
+        for key, entry in list(entries.items())[-self.max_size:]:
+            self.entries[key] = entry
+
+    def merge(self, entries: dict):
+        # quotes gathered by another process, the newer of two quotes for the same key wins
+        for key, entry in entries.items():
+            current = self.entries.get(key)
+            if current is None or current['stored_at'] < entry['stored_at']:
+                self.entries[key] = entry
+                self.entries.move_to_end(key)
+
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def save(self):
+        if self.location is None:
+            return
+
+        tmp_location = self.location.with_name(f'{self.location.name}.{os.getpid()}.{uuid4().hex}.tmp')
+        try:
+            self.location.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_location, mode='w', encoding='utf8') as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_location, self.location)
+        except OSError as e:
+            # the cache is only an optimization, failing to save it must never fail a run
+            LOGS['stdout_error'].error(f'Price cache "{self.location}" could not be saved: {e!r}')
+            try:
+                os.remove(tmp_location)
+            except OSError:
+                pass
+
+    def clear(self):
+        self.entries.clear()
+
+    def snapshot(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            'expired': self.expired,
+            'evictions': self.evictions
+        }
@@ -1,4 +1,5 @@
-import re
+from market.models import Currency
+from market.currency import parse_price
 from typing import Union
 
 
@@ -11,14 +12,8 @@ async def convert_comma_to_int(string: str) -> Union[int, None]:
     return int(string)
 
 
-async def extract_price(price: str) -> Union[float, None]:
-    if price is None:
-        return None
-
-    list_of_numbers = re.findall('\d+', price)
-    price_without_currency = '.'.join(list_of_numbers).strip()
-
-    return float(price_without_currency)
+async def extract_price(price: str, currency: Currency = None) -> Union[float, None]:
+    return parse_price(price, currency=currency)
 
 
 async def dict_none_filter(dictionary: dict) -> dict:
@@ -9,7 +9,6 @@ from database.database import Database
 from database.utils import graceful_shutdown
 from market_arbitrage.models import AppsSet
 from apps.models import App, AppDetails, AppOwned
-from market.models import CardBorder, ItemClass
 from apps.apps_handler import AppsHandler
 from market.market_handler import MarketHandler
 
@@ -35,7 +34,10 @@ class CollectAppsHandler:
                             workers_amount: int = WORKERS_AMOUNT,
                             timeout: int = TIMEOUT,
                             timeout_market: int = TIMEOUT_MARKET,
-                            proxy: bool = False):
+                            proxy: bool = False,
+                            stream: bool = False,
+                            card_index: bool = False,
+                            rate_share: float = 1.0):
 
         self = cls()
         self.cache_check = cache_check
@@ -43,7 +45,8 @@ class CollectAppsHandler:
         self.requests_handler = await RequestHandler.create(
             proxy=proxy,
             workers_amount=workers_amount,
-            timeout=timeout
+            timeout=timeout,
+            rate_share=rate_share
         )
 
         async with asyncio.TaskGroup() as tg:
@@ -69,9 +72,19 @@ class CollectAppsHandler:
         self.apps_handler = apps_handler.result()
         self.market_handler = market_handler.result()
 
+        # one crawl of every card listing replaces a market search per app
+        if card_index:
+            await self.market_handler.crawl_cards()
+
         self.scraper_func = self.all_apps_scraper
-        self.apps = await self.apps_handler.get_apps_list()
-        self.apps_amount = len(self.apps)
+
+        # streamed apps are dispatched to the workers while the list is still downloading
+        if stream:
+            self.apps_amount = 0
+            self.apps = self.count_apps(self.apps_handler.iter_apps_list(executor=True))
+        else:
+            self.apps = await self.apps_handler.get_apps_list()
+            self.apps_amount = len(self.apps)
 
         return self
 
@@ -82,7 +95,9 @@ class CollectAppsHandler:
                               workers_amount: int = WORKERS_AMOUNT,
                               timeout: int = TIMEOUT,
                               timeout_market: int = TIMEOUT_MARKET,
-                              proxy: bool = False):
+                              proxy: bool = False,
+                              card_index: bool = False,
+                              rate_share: float = 1.0):
 
         self = cls()
 
@@ -91,7 +106,8 @@ class CollectAppsHandler:
         self.requests_handler = await RequestHandler.create(
             proxy=proxy,
             workers_amount=workers_amount,
-            timeout=timeout
+            timeout=timeout,
+            rate_share=rate_share
         )
 
         async with asyncio.TaskGroup() as tg:
@@ -122,6 +138,9 @@ class CollectAppsHandler:
         self.apps_handler = apps_handler.result()
         self.market_handler = market_handler.result()
 
+        if card_index:
+            await self.market_handler.crawl_cards()
+
         self.scraper_func = self.owned_apps_scraper
         self.apps = await self.apps_handler.get_owned_apps(
             api_key=self.users_db.data[login]['api_key'],
@@ -154,11 +173,9 @@ class CollectAppsHandler:
             await self.db.displace_object(object_id=app_details.appid, model=apps_set)
             return apps_set
 
-        app_market_details = await self.market_handler.market_search(
-            client_session=session,
-            tag_app=app_details.appid,
-            tag_item_class=ItemClass.Card,
-            tag_cardborder=CardBorder.Normal
+        app_market_details = await self.market_handler.get_app_cards(
+            app_id=app_details.appid,
+            client_session=session
         )
 
         if await self.checker.check_market(app_market=app_market_details):
@@ -196,18 +213,12 @@ class CollectAppsHandler:
             app_details=app_details,
         )
 
-        LOGS['stdout_info'].info(
-            f'APPID: {apps_set.app_id} - '
-            f'REDIRECT: {apps_set.redirect} - '
-            f'COUNT: {sum(len(v) for k, v in self.db.data.items())} of {self.apps_amount} - '
-            f'ADDED: {apps_set.apps_set} - '
-            f'WHITELIST: {len(self.db.data.get("whitelist")) if "whitelist" in self.db.data else None}'
-        )
+        await self.log_app(apps_set)
 
         return None
 
     async def check_prepared_list(self) -> None:
-        all_db = await Database.connect(location=str(ALL_APPS_JSON_FILE), read_only=True)
+        all_db = await Database.connect(location=str(ALL_APPS_JSON_FILE), read_only=True, lazy=True)
         for app in self.apps:
             cache = await all_db.is_cached(str(app.appid), return_value=True, keys_to_check=self.cache_check)
             if cache:
@@ -218,13 +229,7 @@ class CollectAppsHandler:
                 )
                 await self.db.displace_object(object_id=cache['value']['search_key'], model=apps_set)
 
-                LOGS['stdout_info'].info(
-                    f'APPID: {apps_set.app_id} - '
-                    f'REDIRECT: {apps_set.redirect} - '
-                    f'COUNT: {sum(len(v) for k, v in self.db.data.items())} of {self.apps_amount} - '
-                    f'ADDED: {apps_set.apps_set} - '
-                    f'WHITELIST: {len(self.db.data.get("whitelist")) if "whitelist" in self.db.data else None}'
-                )
+                await self.log_app(apps_set)
 
         await self.db.write()
 
@@ -237,11 +242,9 @@ class CollectAppsHandler:
         if await self.db.is_cached(app_id, keys_to_check=self.cache_check):
             return None
 
-        app_market_details = await self.market_handler.market_search(
-            client_session=session,
-            tag_app=app_id,
-            tag_item_class=ItemClass.Card,
-            tag_cardborder=CardBorder.Normal
+        app_market_details = await self.market_handler.get_app_cards(
+            app_id=app_id,
+            client_session=session
         )
 
         if await self.checker.check_market(app_market=app_market_details):
@@ -250,13 +253,7 @@ class CollectAppsHandler:
                                response=True, app_type='game')
             await self.db.displace_object(object_id=app_id, model=apps_set)
 
-            LOGS['stdout_info'].info(
-                f'APPID: {apps_set.app_id} - '
-                f'REDIRECT: {apps_set.redirect} - '
-                f'COUNT: {sum(len(v) for k, v in self.db.data.items())} of {self.apps_amount} - '
-                f'ADDED: {apps_set.apps_set} - '
-                f'WHITELIST: {len(self.db.data.get("whitelist")) if "whitelist" in self.db.data else None}'
-            )
+            await self.log_app(apps_set)
 
             return None
 
@@ -265,16 +262,40 @@ class CollectAppsHandler:
                            response=True, app_type='game')
         await self.db.displace_object(object_id=app_id, model=apps_set)
 
+        await self.log_app(apps_set)
+
+        return None
+
+    async def count_apps(self, apps):
+        # a streamed list has no length up front, it is known once the last app has been dispatched
+        async for app in apps:
+            self.apps_amount += 1
+            yield app
+
+    async def log_app(self, apps_set: AppsSet):
+        # set sizes come from one query, a SQLite database would otherwise block the loop on every count
+        sizes = await self.db.section_sizes()
+
         LOGS['stdout_info'].info(
             f'APPID: {apps_set.app_id} - '
             f'REDIRECT: {apps_set.redirect} - '
-            f'COUNT: {sum(len(v) for k, v in self.db.data.items())} of {self.apps_amount} - '
+            f'COUNT: {sum(sizes.values())} of {self.apps_amount} - '
             f'ADDED: {apps_set.apps_set} - '
-            f'WHITELIST: {len(self.db.data.get("whitelist")) if "whitelist" in self.db.data else None}'
+            f'WHITELIST: {sizes.get("whitelist")}'
         )
 
-        return None
+    async def close(self):
+        # the market handler saves the price cache and the item_nameid mapping on close
+        if self.market_handler is not None:
+            await self.market_handler.close()
+            self.market_handler = None
+
+        await self.requests_handler.close()
 
     @graceful_shutdown
     async def collect_apps(self):
-        return await self.requests_handler.create_workers(queue_items=self.apps, db=self.db, func=self.scraper_func)
+        self.db.start_checkpoints()
+        try:
+            return await self.requests_handler.create_workers(queue_items=self.apps, db=self.db, func=self.scraper_func)
+        finally:
+            await self.db.stop_checkpoints()
@@ -1,14 +1,15 @@
 import asyncio
 from request_handler.requests_handler import RequestHandler
 from conf.settings import WORKERS_AMOUNT, TIMEOUT_MARKET, OWNED_APPS_JSON_FOLDER, BOOSTER_PACKS_JSON_FILE, \
-    ALL_APPS_JSON_FILE, PREDEFINED_APPS_JSON_FILE, LOGS
-from market.models import MarketCategory, Currency, ItemClass, CardBorder, MarketItem
+    ALL_APPS_JSON_FILE, PREDEFINED_APPS_JSON_FILE, PRICE_HISTORY, LOGS
+from market.models import MarketCategory, Currency, MarketItem, MarketItemPrice
 from utils import one_gem_price, convert_dict_to_list_of_AppInfo, high_variance_filter, \
     fee_eval, probability_of_list_part, arithmetic_mean, booster_pack_craft_cost
 from market.utils import extract_price
 from database.utils import graceful_shutdown
 from market.market_handler import MarketHandler
 from database.database import Database
+from database.price_history import PriceHistory
 from market_arbitrage.models import AppInfo, Booster
 from typing import List, Union
 from random import choice
@@ -23,10 +24,14 @@ class BoosterChecker:
         self.cookies = None
         self.market_handler = None
         self.gems_price = None
+        self.history = None
+        self.booster_prices = None
 
     @classmethod
     async def init_apps(cls, workers_amount: int = WORKERS_AMOUNT, timeout_market: int = TIMEOUT_MARKET,
-                        proxy: bool = False, truncate_boosters_db: bool = False, use_predefined_apps_db: bool = False):
+                        proxy: bool = False, truncate_boosters_db: bool = False, use_predefined_apps_db: bool = False,
+                        history: bool = PRICE_HISTORY, bulk_booster_prices: bool = False, card_index: bool = False,
+                        rate_share: float = 1.0):
         self = cls()
 
         async with asyncio.TaskGroup() as tg:
@@ -36,17 +41,18 @@ class BoosterChecker:
 
             if use_predefined_apps_db:
                 apps_db = tg.create_task(
-                    Database.connect(location=PREDEFINED_APPS_JSON_FILE, read_only=True)
+                    Database.connect(location=PREDEFINED_APPS_JSON_FILE, read_only=True, lazy=True)
                 )
             else:
                 apps_db = tg.create_task(
-                    Database.connect(location=ALL_APPS_JSON_FILE, read_only=True)
+                    Database.connect(location=ALL_APPS_JSON_FILE, read_only=True, lazy=True)
                 )
 
             requests_handler = tg.create_task(RequestHandler.create(
                     proxy=proxy,
                     workers_amount=workers_amount,
-                    timeout=timeout_market
+                    timeout=timeout_market,
+                    rate_share=rate_share
                 )
             )
 
@@ -62,6 +68,16 @@ class BoosterChecker:
 
         self.gems_price = await self.mean_gems_price()
 
+        if history:
+            self.history = await PriceHistory.create()
+
+        # one paginated booster search per run instead of a priceoverview request per app
+        if bulk_booster_prices:
+            self.booster_prices = await self.market_handler.booster_prices()
+
+        if card_index:
+            await self.market_handler.crawl_cards()
+
         if truncate_boosters_db:
             self.db.data.clear()
 
@@ -73,7 +89,8 @@ class BoosterChecker:
     @classmethod
     async def init_owned_apps(cls, login: str, workers_amount: int = WORKERS_AMOUNT,
                               timeout_market: int = TIMEOUT_MARKET, proxy: bool = False,
-                              truncate_boosters_db: bool = False):
+                              truncate_boosters_db: bool = False, history: bool = PRICE_HISTORY,
+                              bulk_booster_prices: bool = False, card_index: bool = False, rate_share: float = 1.0):
         self = cls()
 
         async with asyncio.TaskGroup() as tg:
@@ -83,14 +100,16 @@ class BoosterChecker:
 
             apps_db = tg.create_task(Database.connect(
                     location=str(OWNED_APPS_JSON_FOLDER / f'{login}_apps.json'),
-                    read_only=True
+                    read_only=True,
+                    lazy=True
                 )
             )
 
             requests_handler = tg.create_task(RequestHandler.create(
                     proxy=proxy,
                     workers_amount=workers_amount,
-                    timeout=timeout_market
+                    timeout=timeout_market,
+                    rate_share=rate_share
                 )
             )
 
@@ -106,6 +125,16 @@ class BoosterChecker:
 
         self.gems_price = await self.mean_gems_price()
 
+        if history:
+            self.history = await PriceHistory.create()
+
+        # one paginated booster search per run instead of a priceoverview request per app
+        if bulk_booster_prices:
+            self.booster_prices = await self.market_handler.booster_prices()
+
+        if card_index:
+            await self.market_handler.crawl_cards()
+
         if truncate_boosters_db:
             self.db.data.clear()
 
@@ -114,11 +143,11 @@ class BoosterChecker:
 
         return self
 
-    async def mean_gems_price(self) -> float:
+    async def mean_gems_price(self, currency: Currency = Currency.USD) -> float:
         sack_of_gems = await self.market_handler.get_price_overview(
             market_game=MarketCategory.STEAM,
             market_hash_name='753-Sack of Gems',
-            currency=Currency.USD
+            currency=currency
         )
 
         one_gem_mean_price = await one_gem_price(float(sack_of_gems.lowest_price))
@@ -158,6 +187,23 @@ class BoosterChecker:
 
         return None, None
 
+    async def get_booster_price(self, app_id: str, app_name: str, session) -> MarketItemPrice:
+        listing = self.booster_prices.get(app_id) if self.booster_prices is not None else None
+        # a listing whose price could not be parsed is priced by its own request like an unlisted pack
+        if listing is not None and listing.price is not None:
+            return MarketItemPrice(
+                success=True,
+                lowest_price=str(listing.price),
+                volume=str(listing.listings),
+                currency=Currency.USD.name,
+                currency_num=Currency.USD.value
+            )
+
+        return await self.market_handler.get_price_overview(
+            market_hash_name=f'{app_id}-{app_name} Booster Pack',
+            client_session=session
+        )
+
     async def check_cards_volume(self, cards: List[MarketItem], session) -> int:
         random_card = choice(cards)
         card_market_details = await self.market_handler.get_price_overview(
@@ -174,19 +220,11 @@ class BoosterChecker:
 
         async with asyncio.TaskGroup() as tg:
             market_cards = tg.create_task(
-                self.market_handler.market_search(
-                    tag_app=app_id,
-                    tag_item_class=ItemClass.Card,
-                    tag_cardborder=CardBorder.Normal,
-                    client_session=session
-                )
+                self.market_handler.get_app_cards(app_id=app_id, client_session=session)
             )
             if check_booster_pack:
                 market_booster = tg.create_task(
-                    self.market_handler.get_price_overview(
-                        market_hash_name=f'{app_id}-{app_name} Booster Pack',
-                        client_session=session
-                    )
+                    self.get_booster_price(app_id=app_id, app_name=app_name, session=session)
                 )
         market_cards = market_cards.result()
         market_booster = market_booster.result() if check_booster_pack else None
@@ -245,11 +283,41 @@ class BoosterChecker:
 
         await self.db.displace_object(object_id=app_id, model=booster_model)
 
+        if self.history is not None:
+            self.history.record(
+                app_id=app_id,
+                gems_price=self.gems_price,
+                cards_price=await arithmetic_mean(cards_prices) if cards_prices else None,
+                cards_profit=booster_cards_profit,
+                cards_volume=cards_volume,
+                booster_price=float(market_booster.lowest_price) if check_booster_pack else None,
+                booster_profit=booster_pack_profit,
+                booster_volume=booster_pack_volume
+            )
+
+    async def close(self):
+        # sharded runs never go through check_boosters_profit, pending history rows are flushed here as well
+        if self.history is not None:
+            await self.history.close()
+
+        # the market handler saves the price cache and the item_nameid mapping on close
+        if self.market_handler is not None:
+            await self.market_handler.close()
+            self.market_handler = None
+
+        await self.requests_handler.close()
+
     @graceful_shutdown
     async def check_boosters_profit(self, **kwargs):
-        await self.requests_handler.create_workers(
-            queue_items=self.apps,
-            db=self.db,
-            func=self.boosters_scraper,
-            **kwargs
-        )
+        self.db.start_checkpoints()
+        try:
+            await self.requests_handler.create_workers(
+                queue_items=self.apps,
+                db=self.db,
+                func=self.boosters_scraper,
+                **kwargs
+            )
+        finally:
+            await self.db.stop_checkpoints()
+            if self.history is not None:
+                await self.history.close()
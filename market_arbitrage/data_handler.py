@@ -1,11 +1,54 @@
+import json
+import heapq
 import asyncio
 from asyncio.proactor_events import _ProactorBasePipeTransport
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from typing import Callable, Iterator
 
-from conf.settings import ALL_APPS_JSON_FILE, OWNED_APPS_JSON_FOLDER, PREDEFINED_APPS_JSON_FILE, BOOSTER_PACKS_JSON_FILE
+from conf.settings import ALL_APPS_JSON_FILE, OWNED_APPS_JSON_FOLDER, PREDEFINED_APPS_JSON_FILE, \
+    BOOSTER_PACKS_JSON_FILE, ACCOUNTS
 from utils import silence_event_loop_closed
 from database.database import Database
+from market.market_handler import MarketHandler
+from market.currency import CurrencyConverter, get_currency
+from market.models import Currency
 
-from models import Booster, AppInfo
+from models import Booster, AppInfo, QueryPage
+
+
+# fields ranked as numbers, every other field is ranked as text so one sort key never mixes types
+NUMERIC_FIELDS = {
+    'gems_price', 'cards_profit', 'cards_volume', 'booster_profit', 'booster_volume', 'expensive_cards',
+    'expensive_cards_probability'
+}
+
+
+def sortable(value, numeric: bool = True):
+    # the checker stores str(None) for values it could not compute, that is as missing as None
+    if value is None or value == 'None' or value == '':
+        return None
+
+    if not numeric:
+        return str(value)
+
+    # profits are stored as strings, numbers have to compare as numbers
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# booster fields that are amounts of money, scraped in USD
+MONEY_FIELDS = ('gems_price', 'cards_profit', 'booster_profit')
+MONEY_FILTERS = ('min_cards_profit', 'min_booster_profit')
+
+
+def encode_cursor(rank: tuple) -> str:
+    return urlsafe_b64encode(json.dumps(rank).encode('utf8')).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> tuple:
+    return tuple(json.loads(urlsafe_b64decode(cursor.encode('ascii'))))
 
 
 class DataHandler:
@@ -13,6 +56,10 @@ class DataHandler:
         self.login = None
         self.db = None
         self.data = None
+        self.model = None
+        self.nested = None
+        self.currency = Currency.USD
+        self.rate = 1.0
 
     @classmethod
     async def init_apps(cls, predefined_apps: bool = False):
@@ -23,13 +70,8 @@ class DataHandler:
         else:
             self.db = await Database.connect(location=ALL_APPS_JSON_FILE)
 
-        self.data = {
-            outer_k: [
-                AppInfo(app_id=inner_k, **inner_v)
-                for inner_k, inner_v in outer_v.items()
-            ]
-            for outer_k, outer_v in self.db.data.items()
-        }
+        self.model = AppInfo
+        self.nested = True
 
         return self
 
@@ -37,25 +79,192 @@ class DataHandler:
     async def init_user_apps(cls, login: str):
         self = cls()
 
+        self.login = login
         self.db = await Database.connect(location=str(OWNED_APPS_JSON_FOLDER / f'{login}_apps.json'))
-        self.data = {
-            outer_k: [
-                AppInfo(app_id=inner_k, **inner_v)
-                for inner_k, inner_v in outer_v.items()
-            ]
-            for outer_k, outer_v in self.db.data.items()
-        }
+        self.model = AppInfo
+        self.nested = True
 
         return self
 
     @classmethod
-    async def init_boosters(cls):
+    async def init_boosters(cls, login: str = None, currency: Currency | str = None,
+                            converter: CurrencyConverter = None):
         self = cls()
 
+        self.login = login
         self.db = await Database.connect(location=BOOSTER_PACKS_JSON_FILE)
-        self.data = [Booster(app_id=k, **v) for k, v in self.db.data.items()]
+        self.model = Booster
+        self.nested = False
+
+        # an explicit currency wins over the one stored with the account
+        if currency is None and login is not None:
+            accounts_db = await Database.connect(location=ACCOUNTS, read_only=True)
+            currency = (await accounts_db.get(login, {})).get('currency')
+            await accounts_db.disconnect()
+
+        if currency is not None:
+            await self.set_currency(currency, converter=converter)
 
         return self
 
-    async def get_data(self) -> dict:
+    async def set_currency(self, currency: Currency | str, converter: CurrencyConverter = None):
+        currency = get_currency(currency)
+        if currency == Currency.USD:
+            self.currency, self.rate = currency, 1.0
+            self.data = None
+            return
+
+        market_handler = None
+        if converter is None:
+            market_handler = await MarketHandler.create()
+            converter = await CurrencyConverter.create(market_handler)
+
+        try:
+            self.rate = await converter.get_rate(currency)
+        finally:
+            if market_handler is not None:
+                await market_handler.close()
+
+        self.currency = currency
+        self.data = None
+
+    def convert(self, fields: dict) -> dict:
+        if self.rate == 1.0 or self.nested:
+            return fields
+
+        converted = dict(fields)
+        for field in MONEY_FIELDS:
+            value = sortable(fields.get(field))
+            if isinstance(value, float):
+                converted[field] = str(round(value * self.rate, 3))
+
+        return converted
+
+    async def get_data(self) -> dict | list:
+        # every model is built only when the whole collection is asked for
+        if self.data is None:
+            if self.nested:
+                self.data = {
+                    outer_k: [
+                        AppInfo(app_id=inner_k, **inner_v)
+                        for inner_k, inner_v in outer_v.items()
+                    ]
+                    for outer_k, outer_v in self.db.data.items()
+                }
+            else:
+                self.data = [Booster(app_id=k, **self.convert(v)) for k, v in self.db.data.items()]
+
         return self.data
+
+    def rows(self, apps_set: str = None) -> Iterator[tuple[str, dict]]:
+        if not self.nested:
+            yield from self.db.data.items()
+            return
+
+        sets = [apps_set] if apps_set is not None else list(self.db.data)
+        for name in sets:
+            yield from self.db.data.get(name, {}).items()
+
+    @staticmethod
+    def predicate(min_cards_profit: float = None, min_booster_profit: float = None, min_cards_volume: int = None,
+                  min_booster_volume: int = None, added_after: str = None, where: Callable = None) -> Callable:
+        minimums = {
+            'cards_profit': min_cards_profit,
+            'booster_profit': min_booster_profit,
+            'cards_volume': min_cards_volume,
+            'booster_volume': min_booster_volume
+        }
+        minimums = {field: value for field, value in minimums.items() if value is not None}
+
+        def check(key: str, fields: dict) -> bool:
+            for field, minimum in minimums.items():
+                value = sortable(fields.get(field))
+                if not isinstance(value, float) or value < minimum:
+                    return False
+            if added_after is not None and (fields.get('added') or '') <= added_after:
+                return False
+            if where is not None and not where(key, fields):
+                return False
+            return True
+
+        return check
+
+    @staticmethod
+    def ranker(sort_by: str = None, descending: bool = True) -> Callable:
+        numeric = sort_by in NUMERIC_FIELDS
+        missing = 0.0 if numeric else ''
+
+        def rank(key: str, fields: dict) -> tuple:
+            if sort_by is None:
+                return (key,)
+            value = sortable(fields.get(sort_by), numeric)
+            # rows without a value go last in either direction, the key keeps the order total
+            if descending:
+                return value is not None, value if value is not None else missing, key
+            return value is None, value if value is not None else missing, key
+
+        return rank
+
+    def select(self, apps_set: str = None, sort_by: str = None, descending: bool = True, limit: int = None,
+               cursor: str = None, **filters) -> tuple[list[tuple[str, dict]], tuple | None]:
+        check = self.predicate(**filters)
+        rank = self.ranker(sort_by, descending)
+        largest = descending and sort_by is not None
+        after = decode_cursor(cursor) if cursor is not None else None
+
+        def matches():
+            for key, fields in self.rows(apps_set):
+                if not check(key, fields):
+                    continue
+                if after is not None:
+                    position = rank(key, fields)
+                    if (position >= after) if largest else (position <= after):
+                        continue
+                yield key, fields
+
+        order = (lambda row: rank(*row))
+        if limit is None:
+            rows = sorted(matches(), key=order, reverse=largest)
+            return rows, None
+
+        # a heap keeps only `limit` rows, no model is built for anything that is not returned
+        select = heapq.nlargest if largest else heapq.nsmallest
+        rows = select(limit + 1, matches(), key=order)
+
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, rank(*rows[-1])
+
+        return rows, None
+
+    def materialize(self, key: str, fields: dict):
+        return self.model(app_id=key, **self.convert(fields))
+
+    async def query(self, apps_set: str = None, sort_by: str = None, descending: bool = True, limit: int = 50,
+                    cursor: str = None, **filters) -> QueryPage:
+        # thresholds are given in the handler's currency, the stored values are in USD
+        for name in MONEY_FILTERS:
+            if filters.get(name) is not None and not self.nested:
+                filters[name] = filters[name] / self.rate
+
+        rows, last = self.select(apps_set=apps_set, sort_by=sort_by, descending=descending, limit=limit,
+                                 cursor=cursor, **filters)
+
+        return QueryPage(
+            items=[self.materialize(key, fields) for key, fields in rows],
+            next_cursor=encode_cursor(last) if last is not None else None
+        )
+
+    async def top(self, sort_by: str = 'cards_profit', limit: int = 50, **filters) -> list:
+        page = await self.query(sort_by=sort_by, limit=limit, **filters)
+        return page.items
+
+    async def iterate(self, page_size: int = 500, **query):
+        cursor = None
+        while True:
+            page = await self.query(limit=page_size, cursor=cursor, **query)
+            for item in page.items:
+                yield item
+            if page.next_cursor is None:
+                return
+            cursor = page.next_cursor
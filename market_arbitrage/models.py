@@ -63,3 +63,8 @@ class AppsSet(BaseModel):
                 }
             }
         }
+
+
+class QueryPage(BaseModel):
+    items: list
+    next_cursor: str = Field(default=None)
@@ -0,0 +1,157 @@
+import os
+import asyncio
+
+from concurrent.futures import ProcessPoolExecutor
+from conf.settings import PROXIES, LOGS
+from database.database import Database
+from request_handler.proxy_pool import ProxyPool
+from market.price_cache import PriceCache
+from market_arbitrage.apps_collector import CollectAppsHandler
+from market_arbitrage.booster_checker import BoosterChecker
+
+HANDLERS = {
+    'all_apps': (CollectAppsHandler, 'init_all_apps'),
+    'owned_apps': (CollectAppsHandler, 'init_owned_apps'),
+    'boosters': (BoosterChecker, 'init_apps'),
+    'owned_boosters': (BoosterChecker, 'init_owned_apps')
+}
+
+
+# prefetched tables live in one shard's memory, every shard would repeat the whole crawl for itself
+UNSHARDABLE = ('bulk_booster_prices', 'card_index')
+
+
+def split_items(items: list, shards: int, shard_index: int) -> list:
+    return items[shard_index::shards]
+
+
+def run_shard(handler: str, shard_index: int, shards: int, proxies: list, init_kwargs: dict, run_kwargs: dict):
+    return asyncio.run(scrape_shard(handler, shard_index, shards, proxies, init_kwargs, run_kwargs))
+
+
+async def scrape_shard(handler: str, shard_index: int, shards: int, proxies: list,
+                       init_kwargs: dict, run_kwargs: dict) -> dict:
+    handler_cls, init = HANDLERS[handler]
+
+    # shards start from the saved price cache but never write it, the parent merges their quotes and saves once
+    price_cache = await PriceCache.get_shared()
+    price_cache.location = None
+
+    self = await getattr(handler_cls, init)(**init_kwargs)
+
+    self.apps = split_items(self.apps, shards, shard_index)
+    self.apps_amount = len(self.apps)
+
+    if proxies:
+        self.requests_handler.proxy_pool = ProxyPool(proxies)
+
+    # the shard works on a private snapshot and only reports its mutations, the parent is the single writer
+    self.db.journal = []
+    self.db.read_only = True
+    func = self.scraper_func if isinstance(self, CollectAppsHandler) else self.boosters_scraper
+
+    try:
+        await self.requests_handler.create_workers(queue_items=self.apps, func=func, **run_kwargs)
+    finally:
+        await self.close()
+        await self.db.disconnect()
+
+    return {
+        'location': str(self.db.location),
+        'journal': self.db.journal,
+        'failed': [str(item) for item, _ in self.requests_handler.failed],
+        'prices': dict(price_cache.entries)
+    }
+
+
+class ShardedRunner:
+    def __init__(self):
+        self.shards = None
+        self.proxy = None
+        self.proxies = None
+        self.failed = []
+
+    @classmethod
+    async def create(cls, shards: int = os.cpu_count(), proxy: bool = False):
+        self = cls()
+        self.shards = shards
+        self.proxy = proxy
+
+        if self.proxy:
+            proxy_db = await Database.connect(location=PROXIES, read_only=True)
+            self.proxies = [p for p in proxy_db.data.get('proxies') if p.get('host')]
+            await proxy_db.disconnect()
+
+        return self
+
+    def shard_proxies(self, shard_index: int) -> list | None:
+        if not self.proxies:
+            return None
+
+        return split_items(self.proxies, self.shards, shard_index) or [self.proxies[shard_index % len(self.proxies)]]
+
+    async def run(self, handler: str, run_kwargs: dict = None, **init_kwargs) -> int:
+        truncate = init_kwargs.pop('truncate_boosters_db', False)
+        init_kwargs['proxy'] = self.proxy
+
+        unshardable = [name for name in UNSHARDABLE if init_kwargs.get(name)]
+        if unshardable:
+            raise ValueError(f'{", ".join(unshardable)} cannot be used with sharding')
+
+        # a streamed apps list is an async iterator, only a list can be sliced between the shards
+        if init_kwargs.get('stream'):
+            raise ValueError('stream cannot be used with sharding')
+
+        # without proxies every shard leaves from the same address, so they share the configured rates
+        if not self.proxy:
+            init_kwargs['rate_share'] = 1 / self.shards
+
+        loop = asyncio.get_running_loop()
+        with ProcessPoolExecutor(max_workers=self.shards) as executor:
+            results = await asyncio.gather(*[
+                loop.run_in_executor(
+                    executor, run_shard, handler, i, self.shards,
+                    self.shard_proxies(i), init_kwargs, run_kwargs or {}
+                )
+                for i in range(self.shards)
+            ])
+
+        db = await Database.connect(location=results[0]['location'])
+        if truncate:
+            db.data.clear()
+
+        changes = 0
+        for result in results:
+            for object_id, data in result['journal']:
+                await db.displace(object_id, data)
+                changes += 1
+            self.failed.extend(result['failed'])
+
+        await db.write()
+        await db.disconnect()
+
+        price_cache = await PriceCache.get_shared()
+        for result in results:
+            price_cache.merge(result['prices'])
+        price_cache.save()
+
+        LOGS['stdout_info'].info(
+            f'SHARDS: {self.shards} - CHANGES: {changes} - FAILED: {len(self.failed)}'
+        )
+
+        return changes
+
+    async def collect_all_apps(self, **init_kwargs) -> int:
+        return await self.run('all_apps', **init_kwargs)
+
+    async def collect_owned_apps(self, login: str, **init_kwargs) -> int:
+        return await self.run('owned_apps', login=login, **init_kwargs)
+
+    async def check_boosters_profit(self, login: str = None, check_booster_pack: bool = True,
+                                    check_volume: bool = False, **init_kwargs) -> int:
+        run_kwargs = {'check_booster_pack': check_booster_pack, 'check_volume': check_volume}
+
+        if login is not None:
+            return await self.run('owned_boosters', run_kwargs=run_kwargs, login=login, **init_kwargs)
+
+        return await self.run('boosters', run_kwargs=run_kwargs, **init_kwargs)
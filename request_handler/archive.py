@@ -0,0 +1,79 @@
+import gzip
+import json
+
+from time import time
+from pathlib import Path
+from conf.settings import ARCHIVE_FILE, LOGS
+from .exceptions import ReplayMissError
+
+
+class ResponseArchive:
+    RECORD = 'record'
+    REPLAY = 'replay'
+
+    def __init__(self):
+        self.location = None
+        self.mode = None
+        self.file = None
+        self.responses = {}
+
+    @classmethod
+    async def create(cls, mode: str, location: Path = ARCHIVE_FILE):
+        self = cls()
+        self.location = Path(location)
+        self.mode = mode
+
+        if self.mode == self.RECORD:
+            self.location.parent.mkdir(parents=True, exist_ok=True)
+            # every open appends a new gzip member, so earlier sessions are never rewritten
+            self.file = gzip.open(self.location, mode='at', encoding='utf8')
+        elif self.mode == self.REPLAY:
+            self.load()
+        else:
+            raise ValueError(f'Unknown archive mode: {mode}')
+
+        return self
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == self.RECORD
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == self.REPLAY
+
+    @staticmethod
+    def key(method: str, url: str, params: dict = None) -> str:
+        return json.dumps([method, url, sorted((params or {}).items())], default=str)
+
+    def load(self):
+        with gzip.open(self.location, mode='rt', encoding='utf8') as f:
+            try:
+                for line in f:
+                    record = json.loads(line)
+                    self.responses[self.key(record['method'], record['url'], record['params'])] = record
+            except (EOFError, ValueError):
+                # a killed recording leaves a truncated last member, everything before it is usable
+                LOGS['stdout_error'].error(f'Archive "{self.location}" is truncated, loaded {len(self.responses)}')
+
+    def record(self, method: str, url: str, params: dict, status: int, body: str):
+        record = {
+            'method': method,
+            'url': url,
+            'params': params,
+            'status': status,
+            'timestamp': time(),
+            'body': body
+        }
+        self.file.write(json.dumps(record, default=str) + '\n')
+
+    def replay(self, method: str, url: str, params: dict = None) -> str:
+        try:
+            return self.responses[self.key(method, url, params)]['body']
+        except KeyError:
+            raise ReplayMissError(url=url, params=params)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -5,3 +5,60 @@ class TooManyRequestsError(Exception):
             *args,
             **kwargs):
         super().__init__(message)
+
+
+class EmptyProxyPoolError(Exception):
+    def __init__(
+            self,
+            message='No usable proxies were loaded into the proxy pool',
+            *args,
+            **kwargs):
+        super().__init__(message)
+
+
+class RequestFailedError(Exception):
+    def __init__(
+            self,
+            message='Request failed',
+            *args,
+            **kwargs):
+        super().__init__(message)
+
+
+class RetriesExhaustedError(RequestFailedError):
+    def __init__(
+            self,
+            message='Request failed after all retry attempts',
+            url: str = None,
+            attempts: int = None,
+            last_exception: Exception = None,
+            *args,
+            **kwargs):
+        self.url = url
+        self.attempts = attempts
+        self.last_exception = last_exception
+        super().__init__(f'{message}: {url} - Attempts: {attempts} - Last exception: "{type(last_exception).__name__}"')
+
+
+class CircuitOpenError(RequestFailedError):
+    def __init__(
+            self,
+            message='Circuit breaker is open, endpoint is failing fast',
+            endpoint: str = None,
+            *args,
+            **kwargs):
+        self.endpoint = endpoint
+        super().__init__(f'{message}: {endpoint}')
+
+
+class ReplayMissError(RequestFailedError):
+    def __init__(
+            self,
+            message='Response is not in the archive',
+            url: str = None,
+            params: dict = None,
+            *args,
+            **kwargs):
+        self.url = url
+        self.params = params
+        super().__init__(f'{message}: {url} - Params: {params}')
@@ -0,0 +1,129 @@
+from collections import Counter, defaultdict
+from bisect import bisect_left
+from math import inf
+
+
+class Histogram:
+    buckets = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, inf)
+
+    def __init__(self):
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float | None:
+        if not self.count:
+            return None
+
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if cumulative + count >= rank and count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i]
+                if upper == inf:
+                    return lower
+                # linear interpolation inside the bucket, the same estimate Prometheus uses
+                return round(lower + (upper - lower) * (rank - cumulative) / count, 4)
+            cumulative += count
+
+        return None
+
+    def snapshot(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 4),
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99)
+        }
+
+
+class EndpointMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.statuses = Counter()
+        self.errors = Counter()
+        self.retries = 0
+        self.rate_limited = 0
+        self.bytes = 0
+        self.rate_limit_sleep = 0.0
+        self.backoff_sleep = 0.0
+        self.cache_hits = 0
+        self.latency = Histogram()
+
+    def snapshot(self) -> dict:
+        return {
+            'requests': self.requests,
+            'statuses': dict(self.statuses),
+            'errors': dict(self.errors),
+            'retries': self.retries,
+            'rate_limited': self.rate_limited,
+            'rate_limited_ratio': round(self.rate_limited / self.requests, 4) if self.requests else 0.0,
+            'bytes': self.bytes,
+            'rate_limit_sleep': round(self.rate_limit_sleep, 4),
+            'backoff_sleep': round(self.backoff_sleep, 4),
+            'cache_hits': self.cache_hits,
+            'latency': self.latency.snapshot()
+        }
+
+
+class RequestMetrics:
+    prefix = 'steam_arbitrage'
+
+    def __init__(self):
+        self.endpoints = defaultdict(EndpointMetrics)
+
+    def get(self, endpoint: str, proxy=None) -> EndpointMetrics:
+        return self.endpoints[(endpoint, proxy.host if proxy is not None else 'direct')]
+
+    def snapshot(self) -> dict:
+        snapshot = {}
+        for (endpoint, proxy), metrics in self.endpoints.items():
+            snapshot.setdefault(endpoint, {})[proxy] = metrics.snapshot()
+
+        return snapshot
+
+    def prometheus(self) -> str:
+        lines = []
+
+        def metric(name: str, metric_type: str, samples: list):
+            lines.append(f'# TYPE {self.prefix}_{name} {metric_type}')
+            for labels, value in samples:
+                labels = ','.join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(f'{self.prefix}_{name}{{{labels}}} {value}')
+
+        items = [({'endpoint': endpoint, 'proxy': proxy}, metrics)
+                 for (endpoint, proxy), metrics in self.endpoints.items()]
+
+        metric('requests_total', 'counter', [
+            ({**labels, 'status': status}, count)
+            for labels, metrics in items for status, count in metrics.statuses.items()
+        ])
+        metric('request_errors_total', 'counter', [
+            ({**labels, 'exception': exception}, count)
+            for labels, metrics in items for exception, count in metrics.errors.items()
+        ])
+        metric('request_retries_total', 'counter', [(labels, m.retries) for labels, m in items])
+        metric('response_bytes_total', 'counter', [(labels, m.bytes) for labels, m in items])
+        metric('rate_limit_sleep_seconds_total', 'counter', [(labels, m.rate_limit_sleep) for labels, m in items])
+        metric('backoff_sleep_seconds_total', 'counter', [(labels, m.backoff_sleep) for labels, m in items])
+        metric('cache_hits_total', 'counter', [(labels, m.cache_hits) for labels, m in items])
+
+        lines.append(f'# TYPE {self.prefix}_request_latency_seconds histogram')
+        for labels, m in items:
+            labels = ','.join(f'{k}="{v}"' for k, v in labels.items())
+            cumulative = 0
+            for bucket, count in zip(m.latency.buckets, m.latency.counts):
+                cumulative += count
+                le = '+Inf' if bucket == inf else bucket
+                lines.append(f'{self.prefix}_request_latency_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f'{self.prefix}_request_latency_seconds_sum{{{labels}}} {m.latency.sum}')
+            lines.append(f'{self.prefix}_request_latency_seconds_count{{{labels}}} {m.latency.count}')
+
+        return '\n'.join(lines) + '\n'
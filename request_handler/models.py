@@ -1,4 +1,5 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import Any
 
 
 class Proxy(BaseModel):
@@ -16,4 +17,17 @@ class Proxy(BaseModel):
                     "password": self.password
                 }
             ]
-        }
\ No newline at end of file
+        }
+
+
+class WorkerResult(BaseModel):
+    item: Any
+    result: Any = Field(default=None)
+    error: Exception = Field(default=None)
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
@@ -0,0 +1,133 @@
+import asyncio
+
+from random import choices
+from time import monotonic
+from .exceptions import EmptyProxyPoolError
+from conf.settings import PROXY_BUDGET, PROXY_BUDGET_WINDOW, PROXY_COOLDOWN, \
+    PROXY_MAX_FAILURES, PROXY_QUARANTINE, PROXY_QUARANTINE_MAX
+
+
+class ProxyStats:
+    # weight of the newest observation in the moving averages
+    alpha = 0.2
+
+    def __init__(self, host: str, login: str = None, password: str = None):
+        self.host = host
+        self.login = login
+        self.password = password
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.latency = 1.0
+        self.error_rate = 0.0
+        self.rate_limited_rate = 0.0
+        self.failures = 0
+        self.window_start = monotonic()
+        self.window_requests = 0
+        self.cooldown_until = 0.0
+        self.quarantine = PROXY_QUARANTINE
+        self.quarantined_until = 0.0
+        self.probing = False
+        self.probe_started = 0.0
+
+    @property
+    def url(self) -> str:
+        if self.login and self.password:
+            return f'http://{self.login}:{self.password}@{self.host}'
+
+        return f'http://{self.host}'
+
+    @property
+    def health(self) -> float:
+        return (1 - self.error_rate) * (1 - self.rate_limited_rate) / max(self.latency, 0.05)
+
+    def available_at(self, now: float) -> float:
+        if now - self.window_start >= PROXY_BUDGET_WINDOW:
+            self.window_start = now
+            self.window_requests = 0
+
+        budget_reset = self.window_start + PROXY_BUDGET_WINDOW if self.window_requests >= PROXY_BUDGET else 0.0
+
+        # while its single probe request is in flight a proxy is not handed out again
+        probe = self.probe_started + PROXY_QUARANTINE if self.probing else 0.0
+
+        return max(self.cooldown_until, self.quarantined_until, budget_reset, probe)
+
+    def average(self, current: float, observed: float) -> float:
+        return (1 - self.alpha) * current + self.alpha * observed
+
+    def on_success(self, latency: float):
+        self.latency = self.average(self.latency, latency)
+        self.error_rate = self.average(self.error_rate, 0)
+        self.rate_limited_rate = self.average(self.rate_limited_rate, 0)
+        self.failures = 0
+        self.probing = False
+        self.quarantine = PROXY_QUARANTINE
+
+    def on_rate_limited(self):
+        self.rate_limited += 1
+        self.rate_limited_rate = self.average(self.rate_limited_rate, 1)
+        self.cooldown_until = monotonic() + PROXY_COOLDOWN
+        self.probing = False
+
+    def on_error(self):
+        self.errors += 1
+        self.failures += 1
+        self.error_rate = self.average(self.error_rate, 1)
+
+        if self.probing or self.failures >= PROXY_MAX_FAILURES:
+            if self.probing:
+                self.quarantine = min(self.quarantine * 2, PROXY_QUARANTINE_MAX)
+            self.quarantined_until = monotonic() + self.quarantine
+            self.probing = False
+
+    def snapshot(self) -> dict:
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'rate_limited': self.rate_limited,
+            'latency': round(self.latency, 3),
+            'error_rate': round(self.error_rate, 3),
+            'rate_limited_rate': round(self.rate_limited_rate, 3),
+            'health': round(self.health, 3),
+            'quarantined': self.quarantined_until > monotonic()
+        }
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}("{self.host}")'
+
+
+class ProxyPool:
+    def __init__(self, proxies: list):
+        self.proxies = [
+            ProxyStats(host=proxy['host'], login=proxy.get('login'), password=proxy.get('password'))
+            for proxy in proxies if proxy.get('host')
+        ]
+
+    async def acquire(self) -> ProxyStats:
+        if not self.proxies:
+            raise EmptyProxyPoolError
+
+        while True:
+            now = monotonic()
+            available = {proxy: proxy.available_at(now) for proxy in self.proxies}
+            ready = [proxy for proxy, available_at in available.items() if available_at <= now]
+
+            if ready:
+                proxy = choices(ready, weights=[max(proxy.health, 0.01) for proxy in ready])[0]
+
+                # a quarantined proxy gets a single probe request once its quarantine expires
+                if proxy.quarantined_until or proxy.probing:
+                    proxy.quarantined_until = 0.0
+                    proxy.probing = True
+                    proxy.probe_started = now
+
+                proxy.requests += 1
+                proxy.window_requests += 1
+
+                return proxy
+
+            await asyncio.sleep(max(min(available.values()) - now, 0.05))
+
+    def snapshot(self) -> dict:
+        return {proxy.host: proxy.snapshot() for proxy in self.proxies}
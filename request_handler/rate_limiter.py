@@ -0,0 +1,96 @@
+import asyncio
+
+from time import monotonic
+from urllib.parse import urlsplit
+from conf.settings import RATE_LIMIT_INITIAL, RATE_LIMIT_MIN, RATE_LIMIT_MAX, RATE_LIMITS, \
+    RATE_LIMIT_INCREASE, RATE_LIMIT_DECREASE, RATE_LIMIT_PREFIXES
+
+
+class TokenBucket:
+    def __init__(self, rate: float = RATE_LIMIT_INITIAL, min_rate: float = RATE_LIMIT_MIN,
+                 max_rate: float = RATE_LIMIT_MAX, increase: float = RATE_LIMIT_INCREASE,
+                 decrease: float = RATE_LIMIT_DECREASE):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.capacity = 1.0
+        self.tokens = 1.0
+        self.updated = monotonic()
+        self.last_decrease = 0.0
+        self.lock = asyncio.Lock()
+
+    def refill(self):
+        now = monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> float:
+        waited = 0.0
+        async with self.lock:
+            self.refill()
+            while self.tokens < 1:
+                delay = (1 - self.tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+                self.refill()
+            self.tokens -= 1
+
+        return waited
+
+    def on_success(self):
+        # additive increase: roughly +increase req/s for every second of successful traffic
+        self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def on_rate_limited(self):
+        now = monotonic()
+
+        # responses already in flight at the old rate must not collapse the rate several times over
+        if now - self.last_decrease < 1 / self.rate:
+            return None
+
+        self.refill()
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        self.tokens = 0.0
+        self.last_decrease = now
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(rate={self.rate:.3f})'
+
+
+class RateLimiter:
+    def __init__(self, limits: dict = None, share: float = 1.0):
+        # processes sharing one address get a share of every rate, the AIMD ceiling and floor included
+        self.share = share
+        self.limits = {self.endpoint(url): rate * share for url, rate in (limits or RATE_LIMITS).items()}
+        self.buckets = {}
+
+    @staticmethod
+    def endpoint(url: str) -> str:
+        url = urlsplit(url)
+        endpoint = f'{url.netloc}{url.path.rstrip("/")}'
+
+        for prefix in RATE_LIMIT_PREFIXES:
+            prefix = urlsplit(prefix)
+            prefix = f'{prefix.netloc}{prefix.path.rstrip("/")}'
+            if endpoint.startswith(f'{prefix}/'):
+                return prefix
+
+        return endpoint
+
+    def get_bucket(self, url: str) -> TokenBucket:
+        endpoint = self.endpoint(url)
+
+        if endpoint not in self.buckets:
+            rate = self.limits.get(endpoint, RATE_LIMIT_INITIAL * self.share)
+            self.buckets[endpoint] = TokenBucket(
+                rate=rate,
+                min_rate=min(rate, RATE_LIMIT_MIN * self.share),
+                max_rate=max(rate, RATE_LIMIT_MAX * self.share)
+            )
+
+        return self.buckets[endpoint]
+
+    def snapshot(self) -> dict:
+        return {endpoint: bucket.rate for endpoint, bucket in self.buckets.items()}
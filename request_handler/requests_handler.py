@@ -2,31 +2,83 @@ import aiohttp
 import asyncio
 
 from random import choice
-from conf.settings import LOGS, USER_AGENTS, TIMEOUT, WORKERS_AMOUNT, PROXIES
-from .exceptions import TooManyRequestsError
+from copy import deepcopy
+from codecs import getincrementaldecoder
+from time import monotonic
+from itertools import cycle
+from weakref import WeakSet
+from conf.settings import LOGS, USER_AGENTS, TIMEOUT, WORKERS_AMOUNT, PROXIES, SESSION_POOL_SIZE, \
+    CONNECTOR_LIMIT, CONNECTOR_LIMIT_PER_HOST, DNS_CACHE_TTL, KEEPALIVE_TIMEOUT, ARCHIVE_MODE, \
+    STREAM_CHUNK_SIZE
+from .exceptions import TooManyRequestsError, EmptyProxyPoolError, RetriesExhaustedError
+from .rate_limiter import RateLimiter
+from .proxy_pool import ProxyPool
+from .response_cache import ResponseCache
+from .retry_policy import RetryPolicy, CircuitBreakers
+from .metrics import RequestMetrics
+from .models import WorkerResult
+from .archive import ResponseArchive
 from database.database import Database
+from database.codec import JSON, decode
+
+QUEUE_DONE = object()
 
 
 class RequestHandler:
     def __init__(self):
         self.proxy = None
         self.proxies = None
+        self.proxy_pool = None
         self.user_agents = None
         self.workers_amount = None
         self.timeout = None
         self.session = None
+        self.rate_limiter = None
+        self.connector = None
+        self.sessions = None
+        self.sessions_pool = None
+        self.sessions_created = WeakSet()
+        self.pool_size = None
+        self.in_flight = {}
+        self.coalesced = set()
+        self.response_cache = None
+        self.retry_policy = None
+        self.circuit_breakers = None
+        self.failed = []
+        self.metrics = RequestMetrics()
+        self.archive = None
 
     @classmethod
     async def create(cls, workers_amount: int = WORKERS_AMOUNT, timeout: int = TIMEOUT,
-                     proxy: bool = False):
+                     proxy: bool = False, rate_limits: dict = None, rate_share: float = 1.0,
+                     pool_size: int = SESSION_POOL_SIZE,
+                     response_cache: bool = True, retry_policy: RetryPolicy = None,
+                     archive_mode: str = ARCHIVE_MODE):
         self = cls()
 
+        if archive_mode:
+            self.archive = await ResponseArchive.create(mode=archive_mode)
+
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breakers = CircuitBreakers()
+
+        if response_cache:
+            self.response_cache = await ResponseCache.create()
+
+        self.pool_size = pool_size
+
+        self.rate_limiter = RateLimiter(limits=rate_limits, share=rate_share)
+
         self.proxy = proxy
         if self.proxy:
             proxy_db = await Database.connect(location=PROXIES, read_only=True)
             self.proxies = proxy_db.data.get('proxies')
+            self.proxy_pool = ProxyPool(self.proxies)
             await proxy_db.disconnect()
 
+            if not self.proxy_pool.proxies:
+                raise EmptyProxyPoolError
+
         user_agents_db = await Database.connect(location=USER_AGENTS, read_only=True)
         self.user_agents = user_agents_db.data.get('user-agents')
         await user_agents_db.disconnect()
@@ -36,125 +88,419 @@ class RequestHandler:
 
         return self
 
-    def proxy_handler(self):
-        proxy_dict = choice(self.proxies)
-        if 'password' in proxy_dict and 'login' in proxy_dict:
-            proxy = f'http://{proxy_dict["login"]}:{proxy_dict["password"]}@{proxy_dict["host"]}'
-            return proxy
-        else:
-            proxy = f'http://{proxy_dict["host"]}'
-            return proxy
-
-    async def request_handler(self, session: callable, url: str, json=True, params: dict = None) -> dict:
-        while True:
+    async def send_request(self, method: str, session: callable, url: str, json=True,
+                           params: dict = None, data: dict = None, timeout: int = 10,
+                           headers: dict = None, stream: bool = False):
+        if self.archive is not None and self.archive.replaying and method == 'GET' and not stream:
+            body = self.archive.replay(method, url, params)
+            return await decode(JSON, body) if json else body
+
+        endpoint = self.rate_limiter.endpoint(url)
+        bucket = self.rate_limiter.get_bucket(url)
+
+        cache_ttl = None
+        cache_entry = None
+        if self.response_cache is not None and method == 'GET' and not stream:
+            cache_ttl = self.response_cache.ttl(url)
+
+        if cache_ttl is not None:
+            cache_entry = await self.response_cache.get(url, params)
+            if cache_entry is not None and cache_entry.is_fresh(cache_ttl):
+                response = await self.decode_cached(cache_entry) if json else cache_entry.body
+                if response is not None:
+                    self.metrics.get(endpoint).cache_hits += 1
+                    self.archive_response(method, url, params, 200, cache_entry.body)
+                    return response
+                cache_entry = None
+
+        breaker = self.circuit_breakers.get_breaker(url)
+        attempts = 0
+        rate_limited = 0
+        last_exception = None
+
+        while attempts < self.retry_policy.max_attempts and rate_limited < self.retry_policy.max_rate_limited:
+            breaker.check()
+
+            proxy = None
+            metrics = self.metrics.get(endpoint)
             try:
+                waited = monotonic()
+                await bucket.acquire()
+
                 if self.proxy:
-                    proxy = self.proxy_handler()
-                else:
-                    proxy = None
+                    proxy = await self.proxy_pool.acquire()
 
-                response = await asyncio.create_task(session.get(
+                metrics = self.metrics.get(endpoint, proxy)
+                metrics.rate_limit_sleep += monotonic() - waited
+                metrics.requests += 1
+                if attempts or rate_limited:
+                    metrics.retries += 1
+
+                started = monotonic()
+                response = await asyncio.create_task(session.request(
+                    method,
                     url,
                     ssl=False,
-                    proxy=proxy,
-                    timeout=10,
-                    params=params
+                    proxy=proxy.url if proxy is not None else None,
+                    timeout=timeout,
+                    params=params,
+                    data=data,
+                    headers=cache_entry.validators() if cache_entry is not None else headers
                 ))
 
+                metrics.statuses[response.status] += 1
+
                 if response.status == 429:
+                    response.release()
                     raise TooManyRequestsError
 
-                if json:
-                    response = await response.json()
+                if stream:
+                    # the caller consumes and releases the body itself
+                    metrics.latency.observe(monotonic() - started)
+                    if response.status != 304:
+                        response.raise_for_status()
                 else:
-                    response = await response.text()
+                    # the body is buffered by aiohttp, so text() below reuses it
+                    metrics.bytes += len(await response.read())
+                    metrics.latency.observe(monotonic() - started)
+
+                    status = response.status
+                    if cache_entry is not None and status == 304:
+                        body = cache_entry.body
+                        response = await self.decode_cached(cache_entry) if json else body
+                        if response is None:
+                            # the retry goes out without validators and fetches the full body
+                            cache_entry = None
+                            raise ValueError(f'Cached response for "{url}" is not valid JSON')
+                        await self.response_cache.revalidated(cache_entry)
+                        status = 200
+                    else:
+                        body = await response.text()
+                        if cache_ttl is not None and status == 200 and body.strip() != 'null':
+                            await self.response_cache.set(
+                                url=url,
+                                body=body,
+                                params=params,
+                                etag=response.headers.get('ETag'),
+                                last_modified=response.headers.get('Last-Modified')
+                            )
+
+                        response = await decode(JSON, body) if json else body
 
             except TooManyRequestsError as tmr:
+                rate_limited += 1
+                last_exception = tmr
+                metrics.rate_limited += 1
+                # the endpoint answered, so rate limiting never counts against the circuit
+                breaker.on_success()
+                bucket.on_rate_limited()
+                if proxy is not None:
+                    proxy.on_rate_limited()
                 LOGS['stdout_error'].error(
-                    f'Exception: "{type(tmr).__name__}" - Timeout: {self.timeout}s'
+                    f'Exception: "{type(tmr).__name__}" - Rate: {bucket.rate:.3f} req/s - Proxy: {proxy}'
                 )
-                await asyncio.sleep(self.timeout)
             except Exception as e:
+                attempts += 1
+                last_exception = e
+                metrics.errors[type(e).__name__] += 1
+                breaker.on_failure()
+                if proxy is not None:
+                    proxy.on_error()
+                delay = self.retry_policy.delay(attempts - 1)
                 LOGS['error'].error(
-                    f'Exception: "{type(e).__name__}"'
+                    f'Exception: "{type(e).__name__}" - Attempt: {attempts} - Timeout: {delay:.2f}s - Proxy: {proxy}'
                 )
-                await asyncio.sleep(1)
+                if attempts < self.retry_policy.max_attempts:
+                    metrics.backoff_sleep += delay
+                    await asyncio.sleep(delay)
             else:
-                break
+                bucket.on_success()
+                breaker.on_success()
+                if proxy is not None:
+                    proxy.on_success(monotonic() - started)
+                if not stream:
+                    self.archive_response(method, url, params, status, body)
+                return response
+
+        raise RetriesExhaustedError(url=url, attempts=attempts + rate_limited, last_exception=last_exception)
+
+    async def decode_cached(self, cache_entry):
+        try:
+            return await decode(JSON, cache_entry.body)
+        except ValueError:
+            # a torn or corrupted entry is dropped, so the request falls through to the network
+            LOGS['stdout_error'].error(f'Discarding undecodable cache entry for "{cache_entry.header.get("url")}"')
+            self.response_cache.discard(cache_entry.key)
+            return None
+
+    def archive_response(self, method: str, url: str, params: dict, status: int, body: str):
+        if self.archive is not None and self.archive.recording and method == 'GET':
+            self.archive.record(method, url, params, status, body)
+
+    def get_metrics(self) -> dict:
+        return {
+            'requests': self.metrics.snapshot(),
+            'rate_limits': self.rate_limiter.snapshot(),
+            'circuit_breakers': self.circuit_breakers.snapshot(),
+            'proxies': self.proxy_pool.snapshot() if self.proxy_pool is not None else None
+        }
 
-        return response
+    def get_prometheus_metrics(self) -> str:
+        return self.metrics.prometheus()
 
-    async def request_handler_post(self, session: callable, url: str, post_data: dict) -> dict:
-        while True:
-            try:
-                if self.proxy:
-                    proxy = self.proxy_handler()
-                else:
-                    proxy = None
+    @staticmethod
+    def request_key(method: str, url: str, params: dict = None, json=True) -> tuple:
+        return method, url, tuple(sorted((params or {}).items())), json
 
-                response = await asyncio.create_task(session.post(
-                    url,
-                    ssl=False,
-                    proxy=proxy,
-                    timeout=15,
-                    data=post_data
-                ))
+    async def request_handler(self, session: callable, url: str, json=True, params: dict = None,
+                              coalesce: bool = True) -> dict:
+        if not coalesce:
+            return await self.send_request('GET', session=session, url=url, json=json, params=params, timeout=10)
 
-                if response.status == 429:
-                    raise TooManyRequestsError
+        key = self.request_key('GET', url, params, json)
 
-                response_json = await response.json()
+        # identical concurrent lookups share one in-flight request and get their own copy of the result
+        if key in self.in_flight:
+            self.coalesced.add(key)
+            response = await asyncio.shield(self.in_flight[key])
+            return deepcopy(response)
 
-            except TooManyRequestsError as tmr:
-                LOGS['stdout_error'].error(
-                    f'Exception: "{type(tmr).__name__}" - Timeout: {self.timeout}s'
-                )
-                await asyncio.sleep(self.timeout)
-            except Exception as e:
-                LOGS['error'].error(
-                    f'Exception: "{type(e).__name__}" - Timeout: {1}s'
-                )
-                await asyncio.sleep(1)
+        self.coalesced.discard(key)
+        future = asyncio.ensure_future(
+            self.send_request('GET', session=session, url=url, json=json, params=params, timeout=10)
+        )
+        self.in_flight[key] = future
+        future.add_done_callback(lambda _: self.in_flight.pop(key, None))
+
+        response = await asyncio.shield(future)
+
+        # the future's result stays untouched for the joiners still to resume, the leader mutates a copy too
+        if key in self.coalesced:
+            self.coalesced.discard(key)
+            return deepcopy(response)
+
+        return response
+
+    async def stream_request(self, session: callable, url: str, params: dict = None,
+                             chunk_size: int = STREAM_CHUNK_SIZE):
+        if self.archive is not None and self.archive.replaying:
+            body = self.archive.replay('GET', url, params)
+            for i in range(0, len(body), chunk_size):
+                yield body[i:i + chunk_size]
+            return
+
+        cache_ttl = self.response_cache.ttl(url) if self.response_cache is not None else None
+        cache_entry = await self.response_cache.get(url, params) if cache_ttl is not None else None
+
+        if cache_entry is None or not cache_entry.is_fresh(cache_ttl):
+            response = await self.send_request(
+                'GET',
+                session=session,
+                url=url,
+                params=params,
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=self.timeout, sock_read=self.timeout),
+                headers=cache_entry.validators() if cache_entry is not None else None,
+                stream=True
+            )
+
+            if response.status == 304:
+                response.release()
+                await self.response_cache.revalidated(cache_entry)
             else:
-                break
+                async for chunk in self.stream_body(response, url, params, cache_ttl, chunk_size):
+                    yield chunk
+                return
+
+        self.metrics.get(self.rate_limiter.endpoint(url)).cache_hits += 1
+        self.archive_response('GET', url, params, 200, cache_entry.body)
+        for i in range(0, len(cache_entry.body), chunk_size):
+            yield cache_entry.body[i:i + chunk_size]
+
+    async def stream_body(self, response, url: str, params: dict, cache_ttl: int | None, chunk_size: int):
+        metrics = self.metrics.get(self.rate_limiter.endpoint(url))
+        try:
+            encoding = response.get_encoding()
+        except RuntimeError:
+            # aiohttp can only guess a missing charset from a fully read body
+            encoding = 'utf-8'
+        decoder = getincrementaldecoder(encoding)()
+        recorded = [] if self.archive is not None and self.archive.recording else None
+
+        writer = None
+        if cache_ttl is not None and response.status == 200:
+            writer = await self.response_cache.open_writer(
+                url=url,
+                params=params,
+                etag=response.headers.get('ETag'),
+                last_modified=response.headers.get('Last-Modified')
+            )
+
+        try:
+            async for data in response.content.iter_chunked(chunk_size):
+                metrics.bytes += len(data)
+                chunk = decoder.decode(data)
+                if writer is not None:
+                    await writer.write(chunk)
+                if recorded is not None:
+                    recorded.append(chunk)
+                yield chunk
+
+            chunk = decoder.decode(b'', final=True)
+            if chunk:
+                if writer is not None:
+                    await writer.write(chunk)
+                if recorded is not None:
+                    recorded.append(chunk)
+                yield chunk
+        except BaseException:
+            if writer is not None:
+                await writer.abort()
+            raise
+        else:
+            if writer is not None:
+                await writer.commit()
+            if recorded is not None:
+                self.archive_response('GET', url, params, response.status, ''.join(recorded))
+        finally:
+            response.release()
+
+    async def request_handler_post(self, session: callable, url: str, post_data: dict) -> dict:
+        return await self.send_request('POST', session=session, url=url, data=post_data, timeout=15)
+
+    async def create_connector(self) -> aiohttp.TCPConnector:
+        if self.connector is None or self.connector.closed:
+            self.connector = aiohttp.TCPConnector(
+                limit=CONNECTOR_LIMIT,
+                limit_per_host=CONNECTOR_LIMIT_PER_HOST,
+                ttl_dns_cache=DNS_CACHE_TTL,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+                ssl=False
+            )
 
-        return response_json
+        return self.connector
 
     async def create_session(self, cookies=None):
         headers = {
             'User-Agent': choice(self.user_agents),
         }
 
-        session = aiohttp.ClientSession(headers=headers, cookie_jar=cookies)
+        session = aiohttp.ClientSession(
+            headers=headers,
+            cookie_jar=cookies,
+            connector=await self.create_connector(),
+            connector_owner=False
+        )
+        self.sessions_created.add(session)
 
         return session
 
-    async def worker(self, func: callable, async_queue=None, cookies=None, **kwargs):
-        session = await self.create_session(cookies)
-        async with session as session:
-            while True:
-                app = await async_queue.get()
-                await func(session, app, **kwargs)
-                async_queue.task_done()
+    async def get_session(self):
+        if self.sessions is None:
+            self.sessions = [await self.create_session() for _ in range(self.pool_size)]
+            self.sessions_pool = cycle(self.sessions)
 
-    async def create_workers(self, queue_items, func: callable, db=None, **kwargs):
-        async_queue = asyncio.Queue()
+        return next(self.sessions_pool)
 
-        for item in queue_items:
-            async_queue.put_nowait(item)
+    async def close(self):
+        for session in list(self.sessions_created):
+            if not session.closed:
+                await session.close()
 
-        tasks = []
-        for i in range(self.workers_amount):
-            task = asyncio.create_task(self.worker(func, async_queue, **kwargs))
-            tasks.append(task)
+        self.sessions = None
+        self.sessions_pool = None
 
-        await async_queue.join()
+        if self.connector is not None:
+            await self.connector.close()
+            self.connector = None
 
-        for task in tasks:
+        if self.archive is not None:
+            self.archive.close()
 
-            if db is not None:
-                await db.write()
+    async def __aenter__(self):
+        return self
 
-            task.cancel()
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def worker(self, func: callable, async_queue: asyncio.Queue, results: asyncio.Queue,
+                     cookies=None, **kwargs):
+        try:
+            session = await self.create_session(cookies)
+            async with session as session:
+                while True:
+                    item = await async_queue.get()
+                    if item is QUEUE_DONE:
+                        await results.put(QUEUE_DONE)
+                        return None
+
+                    try:
+                        result = await func(session, item, **kwargs)
+                    except Exception as e:
+                        self.failed.append((item, e))
+                        LOGS['error'].error(f'Exception: "{type(e).__name__}" - Item: {item} - {e}')
+                        await results.put(WorkerResult(item=item, error=e))
+                    else:
+                        await results.put(WorkerResult(item=item, result=result))
+        except Exception as e:
+            # a worker that dies still has to be counted as finished, or the consumer waits for it forever
+            LOGS['error'].error(f'Worker stopped: "{type(e).__name__}" - {e}')
+            await results.put(QUEUE_DONE)
+            raise
+
+    async def producer(self, queue_items, async_queue: asyncio.Queue):
+        # sentinels are only sent when the input ends or fails, a cancelled producer has no workers left to take them
+        try:
+            if hasattr(queue_items, '__aiter__'):
+                async for item in queue_items:
+                    await async_queue.put(item)
+            else:
+                for item in queue_items:
+                    await async_queue.put(item)
+        except Exception:
+            await self.stop_workers(async_queue)
+            raise
+
+        await self.stop_workers(async_queue)
+
+    async def stop_workers(self, async_queue: asyncio.Queue):
+        for _ in range(self.workers_amount):
+            await async_queue.put(QUEUE_DONE)
+
+    async def stream_workers(self, queue_items, func: callable, queue_size: int = None, **kwargs):
+        queue_size = queue_size or self.workers_amount * 2
+        async_queue = asyncio.Queue(maxsize=queue_size)
+        results = asyncio.Queue(maxsize=queue_size)
+
+        producer = asyncio.create_task(self.producer(queue_items, async_queue))
+        tasks = [
+            asyncio.create_task(self.worker(func, async_queue, results, **kwargs))
+            for _ in range(self.workers_amount)
+        ]
+
+        try:
+            finished = 0
+            while finished < self.workers_amount:
+                result = await results.get()
+                if result is QUEUE_DONE:
+                    finished += 1
+                    continue
+                yield result
+
+            # every worker has signed off, a producer still waiting on the queue means they died before the input ended
+            errors = [e for e in await asyncio.gather(*tasks, return_exceptions=True) if isinstance(e, Exception)]
+            if errors and not producer.done():
+                raise errors[0]
+
+            # surface a failing input iterable instead of silently stopping early
+            await producer
+        finally:
+            for task in (producer, *tasks):
+                task.cancel()
+            await asyncio.gather(producer, *tasks, return_exceptions=True)
+
+    async def create_workers(self, queue_items, func: callable, db=None, **kwargs):
+        async for _ in self.stream_workers(queue_items, func, **kwargs):
+            pass
 
-        await asyncio.gather(*tasks, return_exceptions=True)
+        if db is not None:
+            await db.write()
@@ -0,0 +1,181 @@
+import os
+import json
+import aiofiles
+
+from time import time
+from uuid import uuid4
+from hashlib import sha1
+from pathlib import Path
+from collections import OrderedDict
+from conf.settings import RESPONSE_CACHE_FOLDER, RESPONSE_CACHE_MAX_SIZE, RESPONSE_CACHE_TTLS
+
+# unfinished entries older than this are left over from a crashed writer
+TMP_MAX_AGE = 3600
+
+
+class CacheEntry:
+    def __init__(self, key: str, header: dict, body: str):
+        self.key = key
+        self.header = header
+        self.body = body
+
+    def is_fresh(self, ttl: int) -> bool:
+        return time() - self.header['stored_at'] < ttl
+
+    def validators(self) -> dict:
+        headers = {}
+        if self.header.get('etag'):
+            headers['If-None-Match'] = self.header['etag']
+        if self.header.get('last_modified'):
+            headers['If-Modified-Since'] = self.header['last_modified']
+
+        return headers
+
+
+class CacheWriter:
+    def __init__(self):
+        self.cache = None
+        self.key = None
+        self.path = None
+        self.tmp_path = None
+        self.file = None
+
+    @classmethod
+    async def open(cls, cache: 'ResponseCache', key: str, header: dict):
+        self = cls()
+        self.cache = cache
+        self.key = key
+        self.path = cache.path(key)
+        self.path.parent.mkdir(exist_ok=True)
+        # shard processes can fetch the same url at once, each writer needs a file of its own
+        self.tmp_path = self.path.with_name(f'{key}.{os.getpid()}.{uuid4().hex}.tmp')
+
+        self.file = await aiofiles.open(self.tmp_path, mode='w', encoding='utf8')
+        await self.file.write(json.dumps(header) + '\n')
+
+        return self
+
+    async def write(self, chunk: str):
+        await self.file.write(chunk)
+
+    async def commit(self):
+        await self.file.close()
+        os.replace(self.tmp_path, self.path)
+        self.cache.register(self.key)
+
+    async def abort(self):
+        await self.file.close()
+        self.tmp_path.unlink(missing_ok=True)
+
+
+class ResponseCache:
+    def __init__(self):
+        self.location = None
+        self.max_size = None
+        self.ttls = None
+        self.size = 0
+        self.entries = OrderedDict()
+
+    @classmethod
+    async def create(cls, location: Path = RESPONSE_CACHE_FOLDER, max_size: int = RESPONSE_CACHE_MAX_SIZE,
+                     ttls: dict = None):
+        self = cls()
+        self.location = Path(location)
+        self.max_size = max_size
+        self.ttls = ttls if ttls is not None else RESPONSE_CACHE_TTLS
+
+        self.location.mkdir(parents=True, exist_ok=True)
+        self.load_index()
+
+        return self
+
+    def load_index(self):
+        files = [entry for entry in self.location.glob('*/*') if entry.is_file()]
+
+        # least recently used entries first, access time is kept in mtime
+        for file in sorted(files, key=lambda f: f.stat().st_mtime):
+            if file.suffix == '.tmp':
+                # another process may still be writing a recent one
+                if time() - file.stat().st_mtime > TMP_MAX_AGE:
+                    file.unlink(missing_ok=True)
+                continue
+            size = file.stat().st_size
+            self.entries[file.name] = size
+            self.size += size
+
+    def ttl(self, url: str) -> int | None:
+        return self.ttls.get(url)
+
+    @staticmethod
+    def cache_key(url: str, params: dict = None) -> str:
+        params = json.dumps(sorted((params or {}).items()), default=str)
+        return sha1(f'{url}?{params}'.encode('utf8')).hexdigest()
+
+    def path(self, key: str) -> Path:
+        return self.location / key[:2] / key
+
+    async def get(self, url: str, params: dict = None) -> CacheEntry | None:
+        key = self.cache_key(url, params)
+        if key not in self.entries:
+            return None
+
+        try:
+            async with aiofiles.open(self.path(key), mode='r', encoding='utf8') as f:
+                header = json.loads(await f.readline())
+                body = await f.read()
+        except (OSError, ValueError):
+            self.discard(key)
+            return None
+
+        await self.touch(key)
+
+        return CacheEntry(key=key, header=header, body=body)
+
+    async def touch(self, key: str):
+        self.entries.move_to_end(key)
+        os.utime(self.path(key))
+
+    async def revalidated(self, entry: CacheEntry):
+        entry.header['stored_at'] = time()
+        await self.write(entry.key, entry.header, entry.body)
+
+    async def set(self, url: str, body: str, params: dict = None, etag: str = None, last_modified: str = None):
+        writer = await self.open_writer(url=url, params=params, etag=etag, last_modified=last_modified)
+        await writer.write(body)
+        await writer.commit()
+
+    async def write(self, key: str, header: dict, body: str):
+        writer = await CacheWriter.open(self, key, header)
+        await writer.write(body)
+        await writer.commit()
+
+    async def open_writer(self, url: str, params: dict = None, etag: str = None,
+                          last_modified: str = None) -> CacheWriter:
+        header = {
+            'url': url,
+            'params': params,
+            'stored_at': time(),
+            'etag': etag,
+            'last_modified': last_modified
+        }
+        return await CacheWriter.open(self, self.cache_key(url, params), header)
+
+    def register(self, key: str):
+        self.size -= self.entries.pop(key, 0)
+        self.entries[key] = self.path(key).stat().st_size
+        self.size += self.entries[key]
+
+        self.evict()
+
+    def discard(self, key: str):
+        self.size -= self.entries.pop(key, 0)
+        self.path(key).unlink(missing_ok=True)
+
+    def evict(self):
+        while self.size > self.max_size and len(self.entries) > 1:
+            key = next(iter(self.entries))
+            self.discard(key)
+
+    def clear(self):
+        for key in list(self.entries):
+            self.discard(key)
@@ -0,0 +1,95 @@
+from random import uniform
+from time import monotonic
+from conf.settings import RETRY_MAX_ATTEMPTS, RETRY_MAX_RATE_LIMITED, RETRY_BASE_DELAY, RETRY_MAX_DELAY, \
+    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT
+from .exceptions import CircuitOpenError
+from .rate_limiter import RateLimiter
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts: int = RETRY_MAX_ATTEMPTS, max_rate_limited: int = RETRY_MAX_RATE_LIMITED,
+                 base_delay: float = RETRY_BASE_DELAY, max_delay: float = RETRY_MAX_DELAY, jitter: bool = True):
+        self.max_attempts = max_attempts
+        self.max_rate_limited = max_rate_limited
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+
+    def delay(self, attempt: int) -> float:
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+
+        # full jitter keeps workers that failed together from retrying together
+        if self.jitter:
+            return uniform(0, delay)
+
+        return delay
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, endpoint: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout: float = CIRCUIT_RESET_TIMEOUT):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial = False
+        self.trial_started = 0.0
+
+    def check(self):
+        if self.state == self.OPEN:
+            if monotonic() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError(endpoint=self.endpoint)
+            self.state = self.HALF_OPEN
+            self.trial = False
+
+        if self.state == self.HALF_OPEN:
+            # only one trial request goes through until it reports back or times out
+            if self.trial and monotonic() - self.trial_started < self.reset_timeout:
+                raise CircuitOpenError(endpoint=self.endpoint)
+            self.trial = True
+            self.trial_started = monotonic()
+
+    def on_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trial = False
+
+    def on_failure(self):
+        self.failures += 1
+
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = monotonic()
+            self.trial = False
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}("{self.endpoint}", state={self.state})'
+
+
+class CircuitBreakers:
+    def __init__(self, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout: float = CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.breakers = {}
+
+    def get_breaker(self, url: str) -> CircuitBreaker:
+        endpoint = RateLimiter.endpoint(url)
+
+        if endpoint not in self.breakers:
+            self.breakers[endpoint] = CircuitBreaker(
+                endpoint=endpoint,
+                failure_threshold=self.failure_threshold,
+                reset_timeout=self.reset_timeout
+            )
+
+        return self.breakers[endpoint]
+
+    def snapshot(self) -> dict:
+        return {endpoint: breaker.state for endpoint, breaker in self.breakers.items()}
@@ -34,6 +34,9 @@ class SteamLoginHandler:
 
         return self
 
+    async def close(self):
+        await self.requests_handler.close()
+
     async def login(self):
         login_data = await self.create_login_data()
 